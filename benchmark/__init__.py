@@ -0,0 +1,5 @@
+"""Offline benchmarks for the FourMind bot.
+
+The benchmarks run the bot against local stand-ins for the TuringGame websocket API and the
+OpenAI chat completions endpoint, so no API keys or network access are required.
+"""
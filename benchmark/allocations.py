@@ -0,0 +1,123 @@
+"""Allocation cost of the runtime message records over the games of `experiment/data.json`.
+
+Usage:
+    uv run python -m benchmark.allocations --repeat 5
+
+Every message of the corpus is created and then replaced by its enriched version, as the bot does for each
+incoming message and its four-sides analysis. The slotted runtime classes are compared to the pydantic
+records of the persistence boundary, which the bot used at runtime before. Retained bytes are measured with
+tracemalloc after all chats are built, time without tracing.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime as DateTime
+from datetime import timedelta as TimeDelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmark.corpus import REPO_ROOT, ReplayGame, load_experiment_data
+from fourmind.bot.models.chat import Chat, ChatMessage, RichChatMessage
+from fourmind.bot.models.inference import FourSidesAnalysis
+from fourmind.bot.models.persistence import ChatMessageRecord, ChatRecord, RichChatMessageRecord
+
+ANALYSIS: Dict[str, str] = {
+    "factual_information": "The sender greets the others and asks where they are from.",
+    "self_revelation": "The sender appears relaxed and open to a casual conversation.",
+    "relationship": "The sender treats the others as equals and invites them to talk.",
+    "appeal": "The sender wants the others to answer and share something about themselves.",
+}
+
+
+def build_runtime(games: List[ReplayGame]) -> List[Any]:
+    chats: List[Chat] = []
+    for game_id, game in enumerate(games):
+        chat = Chat(id=game_id, players=list(game.players), bot=game.bot, language=game.language)
+        now: DateTime = chat.start_time
+        for message_id, replay in enumerate(game.messages):
+            now += TimeDelta(seconds=replay.offset)
+            # senders arrive as fresh strings from the websocket, they are interned by the records
+            message = ChatMessage(
+                id=message_id, sender="".join(replay.sender), message=replay.message, time=now
+            )
+            chat.add_message(message)
+            analysis = FourSidesAnalysis(sender=message.sender, receivers=chat.humans, **ANALYSIS)
+            chat.add_message(RichChatMessage.from_base(message, analysis))
+        chats.append(chat)
+    return chats
+
+
+def build_pydantic(games: List[ReplayGame]) -> List[Any]:
+    chats: List[ChatRecord] = []
+    for game_id, game in enumerate(games):
+        now: DateTime = DateTime.now()
+        chat = ChatRecord(
+            id=game_id,
+            start_time=now,
+            last_message_time=now,
+            players=list(game.players),
+            bot=game.bot,
+            language=game.language,
+        )
+        humans: List[str] = [player for player in game.players if player != game.bot]
+        for message_id, replay in enumerate(game.messages):
+            now += TimeDelta(seconds=replay.offset)
+            message = ChatMessageRecord(
+                id=message_id, sender="".join(replay.sender), message=replay.message, time=now
+            )
+            chat.messages[message_id] = message
+            analysis = FourSidesAnalysis(sender=message.sender, receivers=humans, **ANALYSIS)
+            chat.messages[message_id] = RichChatMessageRecord(
+                id=message.id,
+                sender=analysis.sender,
+                message=message.message,
+                time=message.time,
+                receivers=analysis.receivers,
+                **ANALYSIS,
+            )
+        chats.append(chat)
+    return chats
+
+
+def measure(
+    games: List[ReplayGame], build: Callable[[List[ReplayGame]], List[Any]], repeat: int
+) -> Tuple[float, int]:
+    """Best seconds per build and retained bytes of the built chats."""
+    best: float = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start: float = time.perf_counter()
+        build(games)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    before: int = tracemalloc.get_traced_memory()[0]
+    chats: List[Any] = build(games)
+    gc.collect()
+    retained: int = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del chats
+    return best, retained
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--data", default=f"{REPO_ROOT}/experiment/data.json", help="user study games")
+    parser.add_argument("--repeat", type=int, default=5, help="timed builds per variant, the best is shown")
+    args: argparse.Namespace = parser.parse_args()
+
+    games: List[ReplayGame] = load_experiment_data(args.data)
+    num_messages: int = sum(len(game.messages) for game in games)
+    print(f"{len(games)} games, {num_messages} messages")
+    print(f"{'records':>10}{'us/message':>13}{'bytes/message':>16}")
+    for name, build in (("pydantic", build_pydantic), ("slotted", build_runtime)):
+        seconds, retained = measure(games, build, args.repeat)
+        print(f"{name:>10}{seconds / num_messages * 1e6:>13.2f}{retained / num_messages:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
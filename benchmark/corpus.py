@@ -0,0 +1,111 @@
+"""Replay corpus built from recorded games in `examples/chats` and `experiment/data.json`."""
+
+import glob
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime as DateTime
+from typing import Any, Dict, List
+
+__all__ = ["ReplayMessage", "ReplayGame", "load_corpus", "REPO_ROOT"]
+
+REPO_ROOT: str = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+GAME_MASTER: str = "GameMaster"
+
+
+@dataclass
+class ReplayMessage:
+    offset: float  # seconds since the previous human message
+    sender: str
+    message: str
+
+
+@dataclass
+class ReplayGame:
+    """A recorded game reduced to what the TuringGame server sends to a bot."""
+
+    source: str
+    bot: str
+    players: List[str]
+    language: str
+    messages: List[ReplayMessage] = field(default_factory=list)
+
+
+def _with_offsets(entries: List[tuple[DateTime, str, str]]) -> List[ReplayMessage]:
+    messages: List[ReplayMessage] = []
+    previous: DateTime | None = None
+    for time, sender, message in sorted(entries, key=lambda entry: entry[0]):
+        offset: float = 0.0 if previous is None else (time - previous).total_seconds()
+        messages.append(ReplayMessage(offset=offset, sender=sender, message=message))
+        previous = time
+    return messages
+
+
+def load_example_chats(path: str) -> List[ReplayGame]:
+    """Load persisted FourMind chats; the bot's own messages are dropped since the bot under test replies."""
+    games: List[ReplayGame] = []
+    for file in sorted(glob.glob(os.path.join(path, "*.json"))):
+        with open(file) as f:
+            chat: Dict[str, Any] = json.load(f)
+        bot: str = chat["bot"]
+        entries = [
+            (DateTime.fromisoformat(m["time"]), m["sender"], m["message"])
+            for m in chat["messages"].values()
+            if m["sender"] != bot
+        ]
+        games.append(
+            ReplayGame(
+                source=os.path.basename(file),
+                bot=bot,
+                players=list(dict.fromkeys([*chat["humans"], bot])),
+                language=chat.get("language", "en"),
+                messages=_with_offsets(entries),
+            )
+        )
+    return games
+
+
+def load_experiment_data(path: str) -> List[ReplayGame]:
+    """Load games of the user study; the FourMind bot slot is taken over by the bot under test."""
+    with open(path) as f:
+        data: List[Dict[str, Any]] = json.load(f)
+
+    games: List[ReplayGame] = []
+    for game in data:
+        bot_colors: Dict[str, str] = {b["name"]: b["color"] for b in game["bots"]}
+        bot: str = next(
+            (c for n, c in bot_colors.items() if n.startswith("fourmind")), game["bots"][0]["color"]
+        )
+        players: List[str] = list(
+            dict.fromkeys(m["color"] for m in game["messages"] if m["color"] != GAME_MASTER)
+        )
+        players.extend(c for c in bot_colors.values() if c not in players)
+        entries = [
+            (DateTime.fromisoformat(m["create_time"]), m["color"], m["message"])
+            for m in game["messages"]
+            if m["color"] not in (GAME_MASTER, bot)
+        ]
+        if len(players) < 3 or not entries:
+            continue
+        games.append(
+            ReplayGame(
+                source=f"data.json#{game['gameID']}",
+                bot=bot,
+                players=players,
+                language=game.get("language", "en"),
+                messages=_with_offsets(entries),
+            )
+        )
+    return games
+
+
+def load_corpus(
+    chats_path: str = os.path.join(REPO_ROOT, "examples", "chats"),
+    experiment_path: str = os.path.join(REPO_ROOT, "experiment", "data.json"),
+) -> List[ReplayGame]:
+    games: List[ReplayGame] = []
+    if os.path.isdir(chats_path):
+        games.extend(load_example_chats(chats_path))
+    if os.path.isfile(experiment_path):
+        games.extend(load_experiment_data(experiment_path))
+    return games
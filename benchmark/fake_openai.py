@@ -0,0 +1,359 @@
+"""A local stand-in for the OpenAI chat completions endpoint with configurable latency.
+
+The server speaks just enough HTTP/1.1 for the `openai` client: keep-alive connections and
+`POST /v1/chat/completions` with `response_format={"type": "json_schema", ...}`, optionally streamed as
+server-sent events.
+Prompt prefixes are cached like the provider does, in blocks of 128 tokens once a prompt has 1024 tokens,
+and reported as cached prompt tokens in the usage.
+Responses are synthesized from the requested JSON schema, using the prompts to pick plausible senders
+so that the bot's chat state stays consistent during a replay.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, List, Set
+
+__all__ = ["LatencyModel", "FakeOpenAIServer"]
+
+
+@dataclass
+class LatencyModel:
+    """Latency distribution of a completion in seconds.
+
+    Specs are written as `kind:arg[:arg]`:
+    - `fixed:0.8` always waits 0.8 s
+    - `uniform:0.5:2.0` waits between 0.5 s and 2.0 s
+    - `lognormal:1.2:0.4` log-normal with median 1.2 s and sigma 0.4
+    """
+
+    kind: str = "lognormal"
+    a: float = 1.2
+    b: float = 0.4
+
+    @staticmethod
+    def parse(spec: str) -> "LatencyModel":
+        kind, *args = spec.split(":")
+        values: List[float] = [float(arg) for arg in args] + [0.0, 0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+        return LatencyModel(kind=kind, a=values[0], b=values[1])
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.a
+        if self.kind == "uniform":
+            return random.uniform(self.a, self.b)
+        return random.lognormvariate(math.log(max(self.a, 1e-6)), self.b)
+
+
+@dataclass
+class FakeOpenAIServer:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    corpus: List[str] = field(default_factory=lambda: ["hi", "hello", "what do you think?"])
+    bot_first_probability: float = 0.8
+    # probability that a simulated human message is the message that actually follows in the corpus
+    predictable_probability: float = 0.0
+    first_token_fraction: float = 0.3  # share of the sampled latency spent before a stream's first token
+    stream_chunk_chars: int = 16
+    prefill_per_1k_tokens: float = 0.0  # seconds added to the latency per 1000 prompt tokens
+    model_latency: Dict[str, float] = field(default_factory=dict)  # latency factor per model, default 1
+    host: str = "127.0.0.1"
+    port: int = 0
+
+    requests: Counter[str] = field(default_factory=Counter)
+    prompt_tokens: Counter[str] = field(default_factory=Counter)
+    completion_tokens: Counter[str] = field(default_factory=Counter)  # only counts what has been sent
+    cached_tokens: Counter[str] = field(default_factory=Counter)
+
+    CACHE_BLOCK_CHARS: ClassVar[int] = 512  # 128 tokens
+    CACHE_MIN_CHARS: ClassVar[int] = 4096  # 1024 tokens
+    CACHE_ENTRIES: ClassVar[int] = 100_000
+
+    async def start(self) -> str:
+        """Start serving and return the base url to pass to `AsyncOpenAI`."""
+        self._connections: Set[asyncio.StreamWriter] = set()
+        self._prefix_cache: OrderedDict[bytes, None] = OrderedDict()  # prefix hashes in LRU order
+        self._corpus_index: Dict[str, int] = {text: i for i, text in enumerate(self.corpus)}
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def stop(self) -> None:
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+
+    # HTTP handling
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line: bytes = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers: Dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, value = line.decode().split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+                body: bytes = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "POST" and path.endswith("/chat/completions"):
+                    await self._chat_completion(json.loads(body), writer)
+                else:
+                    self._write_response(writer, 404, {"error": {"message": f"{method} {path} not found"}})
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # the client went away or the server is shutting down in the middle of a request
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+        body: bytes = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n".encode()
+            + body
+        )
+
+    async def _chat_completion(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        json_schema: Dict[str, Any] = request.get("response_format", {}).get("json_schema", {})
+        name: str = json_schema.get("name", "text")
+        prompt: str = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        prompt_tokens: int = self.count_tokens(prompt)
+        self.requests[name] += 1
+        self.prompt_tokens[name] += prompt_tokens
+        cached_tokens: int = self.cache_prefix(prompt)
+        self.cached_tokens[name] += cached_tokens
+
+        content: str = json.dumps(self.synthesize(name, json_schema.get("schema", {}), request["messages"]))
+        if request.get("stream"):
+            include_usage: bool = bool(request.get("stream_options", {}).get("include_usage"))
+            await self._stream_completion(
+                request, name, content, prompt_tokens, cached_tokens, include_usage, writer
+            )
+            return
+
+        await asyncio.sleep(self.sample_latency(request) + self.prefill(prompt_tokens - cached_tokens))
+        completion_tokens: int = self.count_tokens(content)
+        self.completion_tokens[name] += completion_tokens
+        self._write_response(
+            writer,
+            200,
+            {
+                "id": f"chatcmpl-{random.getrandbits(48):x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content, "refusal": None},
+                        "finish_reason": "stop",
+                        "logprobs": None,
+                    }
+                ],
+                "usage": self._usage(prompt_tokens, cached_tokens, completion_tokens),
+            },
+        )
+
+    async def _stream_completion(
+        self,
+        request: Dict[str, Any],
+        name: str,
+        content: str,
+        prompt_tokens: int,
+        cached_tokens: int,
+        include_usage: bool,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Send `content` in chunks spread over the sampled latency, stopping early if the client hangs up."""
+        latency: float = self.sample_latency(request)
+        pieces: List[str] = [
+            content[i : i + self.stream_chunk_chars] for i in range(0, len(content), self.stream_chunk_chars)
+        ]
+        chunk_delay: float = latency * (1 - self.first_token_fraction) / max(1, len(pieces))
+        chunk: Dict[str, Any] = {
+            "id": f"chatcmpl-{random.getrandbits(48):x}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+        }
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n"
+        )
+        await asyncio.sleep(latency * self.first_token_fraction + self.prefill(prompt_tokens - cached_tokens))
+        for i, piece in enumerate(pieces):
+            if writer.is_closing():
+                return
+            delta: Dict[str, Any] = {"content": piece} if i else {"role": "assistant", "content": piece}
+            self._write_event(
+                writer, {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            )
+            self.completion_tokens[name] += self.count_tokens(piece)
+            await writer.drain()
+            await asyncio.sleep(chunk_delay)
+
+        self._write_event(writer, {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if include_usage:
+            usage: Dict[str, Any] = self._usage(prompt_tokens, cached_tokens, self.count_tokens(content))
+            self._write_event(writer, {**chunk, "choices": [], "usage": usage})
+        self._write_event(writer, "[DONE]")
+        writer.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _write_event(writer: asyncio.StreamWriter, payload: Dict[str, Any] | str) -> None:
+        data: str = payload if isinstance(payload, str) else json.dumps(payload)
+        event: bytes = f"data: {data}\n\n".encode()
+        writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+
+    @staticmethod
+    def _usage(prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    def cache_prefix(self, prompt: str) -> int:
+        """Cache all blocks of the prompt and return the tokens of its prefix that were cached before."""
+        digest = hashlib.sha1()
+        cached_chars: int = 0
+        hit: bool = True
+        for end in range(self.CACHE_BLOCK_CHARS, len(prompt) + 1, self.CACHE_BLOCK_CHARS):
+            digest.update(prompt[end - self.CACHE_BLOCK_CHARS : end].encode())
+            key: bytes = digest.copy().digest()
+            if hit and key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                cached_chars = end
+                continue
+            hit = False
+            self._prefix_cache[key] = None
+        while len(self._prefix_cache) > self.CACHE_ENTRIES:
+            self._prefix_cache.popitem(last=False)
+        return self.count_tokens(prompt[:cached_chars]) if cached_chars >= self.CACHE_MIN_CHARS else 0
+
+    def sample_latency(self, request: Dict[str, Any]) -> float:
+        return self.latency.sample() * self.model_latency.get(request.get("model", ""), 1.0)
+
+    def prefill(self, prompt_tokens: int) -> float:
+        """Time to process the uncached prompt before the first completion token."""
+        return self.prefill_per_1k_tokens * prompt_tokens / 1000
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    # Response synthesis
+
+    def synthesize(self, name: str, schema: Dict[str, Any], messages: List[Dict[str, Any]]) -> Any:
+        system: str = str(messages[0].get("content", "")) if messages else ""
+        instruction: str = str(messages[-1].get("content", "")) if messages else ""
+        context: Dict[str, Any] = {"senders": self._senders(system, instruction)}
+
+        if name == "FourSidesAnalysis":
+            analyzed = re.findall(r"\[#\d+\] \([^)]*\) ([^:\n]+):", instruction.split("To-be-analyzed")[-1])
+            if analyzed:
+                context["sender"] = analyzed[0]
+        elif name == "FourSidesBatchAnalysis":
+            context["batch"] = re.findall(
+                r"\[#(\d+)\] \([^)]*\) ([^:\n]+):", instruction.split("To-be-analyzed")[-1]
+            )
+        elif name == "ChatSimulationReponse":
+            ai_user = re.search(r"AI Participant: (\S+)", instruction)
+            horizon = re.search(r"chat history for (\d+)", instruction)
+            context["ai_user"] = ai_user.group(1) if ai_user else None
+            context["horizon"] = int(horizon.group(1)) if horizon else 5
+            context["next_human"] = self._next_human(instruction, context["ai_user"])
+        return self._from_schema(schema, schema.get("$defs", {}), context, key="")
+
+    def _next_human(self, instruction: str, ai_user: str | None) -> str | None:
+        """The corpus message following the last human message of the chat history, if it is known."""
+        if not self.predictable_probability:
+            return None
+        lines = re.findall(r"^\[#\d+\] \([^)]*\) ([^:\n]+): (.*)$", instruction, re.MULTILINE)
+        for sender, text in reversed(lines):
+            if sender != ai_user:
+                index: int | None = self._corpus_index.get(text)
+                return self.corpus[index + 1] if index is not None and index + 1 < len(self.corpus) else None
+        return None
+
+    @staticmethod
+    def _senders(*prompts: str) -> List[str]:
+        senders = re.findall(r"\[#\d+\] \([^)]*\) ([^:\n]+):", "\n".join(prompts))
+        return list(dict.fromkeys(senders)) or ["Blue", "Red"]
+
+    def _from_schema(
+        self, schema: Dict[str, Any], defs: Dict[str, Any], context: Dict[str, Any], key: str
+    ) -> Any:
+        if "$ref" in schema:
+            return self._from_schema(defs[schema["$ref"].split("/")[-1]], defs, context, key)
+        if "anyOf" in schema:
+            return self._from_schema(schema["anyOf"][0], defs, context, key)
+
+        kind = schema.get("type")
+        if kind == "object":
+            return {
+                prop: self._from_schema(sub, defs, context, prop)
+                for prop, sub in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            if key == "messages":
+                items: List[Any] = []
+                for i in range(context.get("horizon", 3)):
+                    context["index"] = i
+                    items.append(self._from_schema(schema["items"], defs, context, "item"))
+                return items
+            if key == "analyses":
+                analyses: List[Any] = []
+                for message_id, sender in context.get("batch", []):
+                    context["message_id"], context["sender"] = int(message_id), sender
+                    analyses.append(self._from_schema(schema["items"], defs, context, "item"))
+                return analyses
+            return [self._from_schema(schema["items"], defs, context, "item") for _ in range(2)]
+        if kind == "integer":
+            return context["message_id"] if key == "message_id" else random.randint(0, 10)
+        if kind == "number":
+            return random.random()
+        if kind == "boolean":
+            return random.random() < 0.5
+        if key == "sender":
+            context["item_sender"] = self._sender(context)
+            return context["item_sender"]
+        if key == "message":
+            next_human: str | None = context.get("next_human")
+            if (
+                next_human is not None
+                and context.get("item_sender") != context.get("ai_user")
+                and random.random() < self.predictable_probability
+            ):
+                # the bot is likely to answer the predicted message
+                context["next_human"], context["after_prediction"] = None, True
+                return next_human
+            return random.choice(self.corpus)
+        if key == "item":
+            return random.choice(context["senders"])
+        return " ".join(random.choices(self.corpus, k=3))
+
+    def _sender(self, context: Dict[str, Any]) -> str:
+        if "sender" in context:
+            return context["sender"]
+        ai_user: str | None = context.get("ai_user")
+        first_or_answer: bool = context.get("index", 0) == 0 or context.pop("after_prediction", False)
+        if ai_user and first_or_answer and random.random() < self.bot_first_probability:
+            return ai_user
+        return random.choice(context["senders"])
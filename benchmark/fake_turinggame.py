@@ -0,0 +1,125 @@
+"""A local stand-in for the TuringGame bot API that replays recorded games over a websocket.
+
+The server implements the message types used by `TuringBotClient`: the api key handshake, `start_game`,
+`bot_ready`, `game_message` in both directions and `end_game`.
+Messages sent by the bot are broadcast back to it, just like the real game does for all chat participants.
+"""
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import websockets
+from websockets.asyncio.server import ServerConnection
+
+from benchmark.corpus import ReplayGame
+from fourmind.bot.common.metrics import Metrics
+
+__all__ = ["FakeTuringGameServer"]
+
+
+@dataclass
+class FakeTuringGameServer:
+    games: List[ReplayGame]
+    num_games: int = 100
+    time_scale: float = 0.1
+    max_gap: float = 30.0
+    ramp: float = 0.05
+    tail: float = 10.0
+    max_messages: int | None = None
+    first_game_id: int = 100_000
+    echo_bot_messages: bool = True
+    host: str = "127.0.0.1"
+    port: int = 0
+
+    replies: Dict[int, int] = field(default_factory=dict)
+
+    async def start(self) -> str:
+        """Start serving and return the endpoint to pass to `FourMind`."""
+        self._server = await websockets.serve(self._handle_bot, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return f"ws://{self.host}:{self.port}"
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_bot(self, websocket: ServerConnection) -> None:
+        handshake: Dict[str, Any] = json.loads(await websocket.recv())
+        await websocket.send(json.dumps({"type": "info", "message": f"welcome {handshake.get('bot_name')}"}))
+
+        self._ready: Dict[int, asyncio.Event] = {}
+        self._last_human_message: Dict[int, float] = {}
+        self._bots: Dict[int, str] = {}
+        receiver: asyncio.Task[None] = asyncio.create_task(self._receive(websocket))
+
+        players: List[asyncio.Task[None]] = []
+        for i in range(self.num_games):
+            game_id: int = self.first_game_id + i
+            players.append(
+                asyncio.create_task(self._play(websocket, game_id, self.games[i % len(self.games)]))
+            )
+            await asyncio.sleep(self.ramp)
+        await asyncio.gather(*players)
+
+        receiver.cancel()
+        await websocket.close(code=1000, reason="benchmark finished")
+
+    async def _receive(self, websocket: ServerConnection) -> None:
+        async for raw in websocket:
+            message: Dict[str, Any] = json.loads(raw)
+            game_id: int = message.get("game_id", -1)
+            if message["type"] == "bot_ready":
+                self._ready[game_id].set()
+            elif message["type"] == "game_message":
+                self.replies[game_id] = self.replies.get(game_id, 0) + 1
+                Metrics.increment("server.bot_messages")
+                last_human: float | None = self._last_human_message.get(game_id)
+                if last_human is not None:
+                    Metrics.observe("server.reply_delay", time.perf_counter() - last_human)
+                if self.echo_bot_messages and game_id in self._bots:
+                    await self._send_game_message(websocket, game_id, message["message"], self._bots[game_id])
+
+    async def _send_game_message(
+        self, websocket: ServerConnection, game_id: int, text: str, player: str
+    ) -> None:
+        await websocket.send(
+            json.dumps(
+                {
+                    "type": "game_message",
+                    "game_id": game_id,
+                    "message": text,
+                    "player": player,
+                    "bot": self._bots[game_id],
+                }
+            )
+        )
+
+    async def _play(self, websocket: ServerConnection, game_id: int, game: ReplayGame) -> None:
+        self._ready[game_id] = asyncio.Event()
+        self._bots[game_id] = game.bot
+        await websocket.send(
+            json.dumps(
+                {
+                    "type": "start_game",
+                    "game_id": game_id,
+                    "bot": game.bot,
+                    "players": game.players,
+                    "language": game.language,
+                }
+            )
+        )
+        await asyncio.wait_for(self._ready[game_id].wait(), timeout=30)
+
+        for message in game.messages[: self.max_messages]:
+            await asyncio.sleep(min(message.offset, self.max_gap) * self.time_scale)
+            self._last_human_message[game_id] = time.perf_counter()
+            Metrics.increment("server.human_messages")
+            await self._send_game_message(websocket, game_id, message.message, message.sender)
+
+        await asyncio.sleep(self.tail)
+        self._bots.pop(game_id)
+        await websocket.send(json.dumps({"type": "end_game", "game_id": game_id}))
+        Metrics.increment("server.games_completed")
@@ -0,0 +1,406 @@
+"""Multi-game load test of the FourMind bot against local TuringGame and OpenAI stand-ins.
+
+Usage:
+    uv run python -m benchmark.loadtest --games 50,100,200 --llm-latency lognormal:1.2:0.4
+
+Each round starts fresh fake servers in a background thread, replays `--games` concurrent games from the
+replay corpus through `FourMind.connect()` and reports p50/p95/p99 latencies of the bot's hot paths
+together with event loop stalls.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Set
+
+from benchmark.corpus import ReplayGame, load_corpus
+from benchmark.fake_openai import FakeOpenAIServer, LatencyModel
+from benchmark.fake_turinggame import FakeTuringGameServer
+from fourmind.bot.common.metrics import Metrics
+
+REPORTED_SERIES: List[str] = [
+    "server.reply_delay",
+    "on_message.latency",
+    "on_message.generation",
+    "generation.budget",
+    "generation.tier.full.latency",
+    "generation.tier.fast.latency",
+    "prediction.latency_saved",
+    "proactive.generation_wait",
+    "analysis.queue_lag",
+    "analysis.enrichment_lag",
+    "llm.FourSidesAnalysis.latency",
+    "llm.FourSidesBatchAnalysis.latency",
+    "llm.ConversationSummary.latency",
+    "summary.lag",
+    "analysis.batch_size",
+    "analysis.ready_games",
+    "teardown.duration",
+    "llm.ChatSimulationReponse.latency",
+    "llm.ChatSimulationReponse.first_item_latency",
+    "gateway.queue_wait.response",
+    "gateway.queue_wait.proactive",
+    "gateway.queue_wait.analysis",
+    "loop.lag",
+    "connection.reconnect_latency",
+]
+
+
+class StallMonitor:
+    """Measures how late the event loop wakes up a periodic timer."""
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1) -> None:
+        self.interval: float = interval
+        self.threshold: float = threshold
+
+    async def run(self) -> None:
+        while True:
+            start: float = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag: float = time.perf_counter() - start - self.interval
+            Metrics.observe("loop.lag", lag)
+            if lag > self.threshold:
+                Metrics.increment("loop.stalls")
+
+
+async def cancel_pending() -> None:
+    """Cancel and await all tasks of the running loop except the calling one."""
+    pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+class ServerThread:
+    """Runs the fake servers on their own event loop so that they do not skew the bot's loop metrics."""
+
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coro: Any) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self) -> None:
+        self.run(cancel_pending())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def run_round(args: argparse.Namespace, corpus: List[ReplayGame], num_games: int) -> Dict[str, Any]:
+    from fourmind.bot.client import FourMind
+    from fourmind.bot.services.analysis.four_sides import BacklogPolicy, FourSidesQueue
+    from fourmind.bot.services.analysis.summarizer import ConversationSummarizer
+    from fourmind.bot.services.llm_gateway import GatewayLimits
+    from fourmind.bot.services.response_cache import CacheMode, ResponseCache
+    from fourmind.bot.services.response_generation.lookahead import SimulationConfig
+
+    SimulationConfig.streaming = not args.no_streaming
+    SimulationConfig.history_token_budget = args.history_budget or None
+    SimulationConfig.adaptive_horizon = not args.fixed_horizon
+    SimulationConfig.prediction_depth = args.prediction_depth
+    SimulationConfig.num_candidates = args.candidates
+    FourMind.PREWARM_LEAD = args.prewarm_lead
+    FourSidesQueue.HISTORY_TOKEN_BUDGET = args.analysis_history_budget or None
+    ConversationSummarizer.ENABLED = not args.no_summary
+    ConversationSummarizer.REFRESH_INTERVAL = args.summary_interval
+    FourSidesQueue.MAX_BATCH_SIZE = args.analysis_batch_size
+    FourSidesQueue.NUM_WORKERS = args.analysis_workers
+    FourSidesQueue.MAX_BACKLOG = args.analysis_backlog
+    FourSidesQueue.BACKLOG_POLICY = BacklogPolicy(args.analysis_backlog_policy)
+
+    Metrics.reset()
+    servers = ServerThread()
+    openai_server = FakeOpenAIServer(
+        latency=LatencyModel.parse(args.llm_latency),
+        corpus=[m.message for game in corpus for m in game.messages],
+        bot_first_probability=args.bot_first_probability,
+        predictable_probability=args.predictable,
+        prefill_per_1k_tokens=args.llm_prefill,
+        model_latency={
+            model: float(factor) for model, factor in (spec.split("=", 1) for spec in args.model_latency)
+        },
+    )
+    game_server = FakeTuringGameServer(
+        games=corpus,
+        num_games=num_games,
+        time_scale=args.time_scale,
+        max_gap=args.max_gap,
+        ramp=args.ramp,
+        tail=args.tail,
+        max_messages=args.max_messages,
+    )
+    openai_url: str = servers.run(openai_server.start())
+    endpoint: str = servers.run(game_server.start())
+
+    bot = FourMind(
+        turinggame_api_key="0" * 36,
+        openai_api_key="sk-benchmark",
+        endpoint=endpoint,
+        openai_base_url=openai_url,
+        response_cache=ResponseCache(CacheMode(args.llm_cache), path=args.llm_cache_path),
+    )
+    bot.gateway.limits = GatewayLimits(
+        max_concurrency=args.llm_concurrency,
+        requests_per_minute=args.llm_rpm,
+        tokens_per_minute=args.llm_tpm,
+    )
+
+    async def main() -> None:
+        monitor: asyncio.Task[None] = asyncio.create_task(StallMonitor().run())
+        await bot.connect()
+        await bot.oai_client.close()
+        monitor.cancel()
+        await cancel_pending()
+
+    started: float = time.perf_counter()
+    # FourMind schedules its tasks on the event loop captured at import time
+    asyncio.get_event_loop().run_until_complete(main())
+    elapsed: float = time.perf_counter() - started
+
+    servers.run(game_server.stop())
+    servers.run(openai_server.stop())
+    servers.close()
+
+    snapshot: Dict[str, Any] = Metrics.snapshot()
+    return {
+        "games": num_games,
+        "elapsed": elapsed,
+        "series": {name: snapshot.get(name, {"count": 0}) for name in REPORTED_SERIES},
+        "counters": snapshot["counters"],
+        "horizon_latency": {
+            int(name.split(".")[2]): stats
+            for name, stats in snapshot.items()
+            if name.startswith("lookahead.horizon.") and name.endswith(".latency")
+        },
+        "llm_requests": dict(openai_server.requests),
+        "llm_prompt_tokens": dict(openai_server.prompt_tokens),
+        "llm_completion_tokens": dict(openai_server.completion_tokens),
+        "llm_cached_tokens": dict(openai_server.cached_tokens),
+        "response_cache": bot.response_cache.stats(),
+    }
+
+
+def print_report(result: Dict[str, Any], reply_budget: float) -> None:
+    print(f"\n=== {result['games']} concurrent games ({result['elapsed']:.1f}s) ===")
+    print(f"{'series':<36}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, stats in result["series"].items():
+        if not stats.get("count"):
+            print(f"{name:<36}{0:>8}")
+            continue
+        print(
+            f"{name:<36}{int(stats['count']):>8}{stats['p50']:>10.3f}{stats['p95']:>10.3f}"
+            f"{stats['p99']:>10.3f}{stats['max']:>10.3f}"
+        )
+    for name, value in sorted(result["counters"].items()):
+        print(f"{name:<36}{value:>8g}")
+    for name, count in result["llm_requests"].items():
+        print(
+            f"{'requests.' + name:<36}{count:>8}  prompt tokens: {result['llm_prompt_tokens'][name]}"
+            f"  cached: {result['llm_cached_tokens'].get(name, 0)}"
+            f"  completion tokens: {result['llm_completion_tokens'].get(name, 0)}"
+        )
+
+    counters: Dict[str, float] = result["counters"]
+    stages: Set[str] = set()
+    for name in counters:
+        for suffix in (".cached_tokens", ".estimated_prompt_tokens"):
+            if name.startswith("llm.") and name.endswith(suffix):
+                stages.add(name.removesuffix(suffix))
+    for name in sorted(stages):
+        # the actual and cached prompt tokens are only reported for completed calls
+        prompt_tokens: float = counters.get(f"{name}.prompt_tokens", 0)
+        cached_tokens: float = counters.get(f"{name}.cached_tokens", 0)
+        line: str = (
+            f"{name}  prompt tokens: {prompt_tokens:.0f}  cached: {cached_tokens:.0f}"
+            f"  cache hit rate: {cached_tokens / max(prompt_tokens, 1):.1%}"
+        )
+        if f"{name}.streams" in counters:
+            line += (
+                f"  streams: {counters[f'{name}.streams']:g}  aborted: {counters.get(f'{name}.aborted', 0):g}"
+                f"  estimated prompt tokens: {counters.get(f'{name}.estimated_prompt_tokens', 0):.0f}"
+            )
+        print(line)
+    for name in sorted(name.removesuffix(".raced") for name in counters if name.endswith(".raced")):
+        raced: float = counters[f"{name}.raced"]
+        print(
+            f"{name}  hedge rate: {counters.get(f'{name}.hedged', 0) / raced:.1%}"
+            f"  hedges won: {counters.get(f'{name}.hedge_won', 0):g}"
+            f"  deadlines exceeded: {counters.get(f'{name}.deadline_exceeded', 0):g}"
+        )
+
+    for horizon, latency in sorted(result["horizon_latency"].items()):
+        prefix: str = f"lookahead.horizon.{horizon}"
+        calls: float = counters.get(f"{prefix}.calls", 0)
+        print(
+            f"horizon {horizon}  simulations: {calls:g}"
+            f"  bot first: {counters.get(f'{prefix}.bot_first', 0) / max(calls, 1):.1%}"
+            f"  latency p50: {latency.get('p50', 0):.3f}  p95: {latency.get('p95', 0):.3f}"
+            f"  completion tokens: {counters.get(f'{prefix}.completion_tokens', 0):g}"
+        )
+
+    lookups: float = counters.get("prediction.lookups", 0)
+    if lookups:
+        saved: Dict[str, float] = result["series"]["prediction.latency_saved"]
+        print(
+            f"prediction  lookups: {lookups:g}  hit rate: {counters.get('prediction.hits', 0) / lookups:.1%}"
+            f"  latency saved p50: {saved.get('p50', 0):.3f}  p95: {saved.get('p95', 0):.3f}"
+        )
+
+    replies: float = counters.get("lookahead.candidates.replies", 0)
+    if replies:
+        print(
+            f"candidates  replies: {replies:g}"
+            f"  rejected: {counters.get('lookahead.candidates.rejected', 0):g}"
+            f"  cancelled: {counters.get('lookahead.candidates.cancelled', 0):g}"
+            f"  exhausted: {counters.get('lookahead.candidates.exhausted', 0) / replies:.1%}"
+        )
+
+    prewarmed: float = counters.get("proactive.prewarm.started", 0)
+    if prewarmed:
+        print(
+            f"prewarm  started: {prewarmed:g}  served: {counters.get('proactive.prewarm.served', 0):g}"
+            f"  wasted: {counters.get('proactive.prewarm.wasted', 0):g}"
+            f" ({counters.get('proactive.prewarm.wasted', 0) / prewarmed:.1%})"
+            f"  cancelled: {counters.get('proactive.prewarm.cancelled', 0):g}"
+        )
+
+    for kind in ("reply", "followup", "proactive", "greeting"):
+        queued: float = counters.get(f"outbound.{kind}.queued", 0)
+        if queued:
+            print(
+                f"outbound {kind}  queued: {queued:g}  sent: {counters.get(f'outbound.{kind}.sent', 0):g}"
+                f"  obsolete: {counters.get(f'outbound.{kind}.obsolete', 0):g}"
+                f"  revised: {counters.get(f'outbound.{kind}.revised', 0):g}"
+            )
+
+    cache: Dict[str, float] = result["response_cache"]
+    if cache["misses"] or cache["stores"]:
+        print("response cache  " + "  ".join(f"{name}: {value:g}" for name, value in cache.items()))
+
+    p95: float | None = result["series"]["server.reply_delay"].get("p95")
+    if p95 is not None:
+        verdict: str = "within" if p95 <= reply_budget else "EXCEEDS"
+        print(f"reply delay p95 {p95:.2f}s {verdict} human-like budget of {reply_budget:.1f}s")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--games", default="100", help="comma separated concurrent game counts, one round each"
+    )
+    parser.add_argument(
+        "--llm-latency", default="lognormal:1.2:0.4", help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA"
+    )
+    parser.add_argument(
+        "--time-scale", type=float, default=0.1, help="factor applied to recorded message gaps"
+    )
+    parser.add_argument(
+        "--max-gap", type=float, default=30.0, help="recorded gaps are clipped to this many seconds"
+    )
+    parser.add_argument(
+        "--llm-prefill", type=float, default=0.0, help="LLM latency added per 1000 prompt tokens in seconds"
+    )
+    parser.add_argument("--ramp", type=float, default=0.05, help="seconds between two game starts")
+    parser.add_argument(
+        "--tail", type=float, default=10.0, help="seconds to wait for replies before end_game"
+    )
+    parser.add_argument("--max-messages", type=int, default=None, help="replay at most this many messages")
+    parser.add_argument("--bot-first-probability", type=float, default=0.8)
+    parser.add_argument(
+        "--predictable", type=float, default=0.3, help="probability that the fake LLM predicts a message"
+    )
+    parser.add_argument(
+        "--prediction-depth", type=int, default=2, help="simulated messages kept after a reply, 0 disables"
+    )
+    parser.add_argument(
+        "--candidates", type=int, default=1, help="simulations raced per reply, the first acceptable one wins"
+    )
+    parser.add_argument("--llm-concurrency", type=int, default=32, help="concurrent LLM calls per model")
+    parser.add_argument("--llm-rpm", type=float, default=5_000, help="LLM requests per minute per model")
+    parser.add_argument("--llm-tpm", type=float, default=4_000_000, help="LLM tokens per minute per model")
+    parser.add_argument(
+        "--analysis-batch-size",
+        type=int,
+        default=8,
+        help="pending messages analyzed per call, 1 disables batching",
+    )
+    parser.add_argument("--analysis-workers", type=int, default=8, help="size of the analysis worker pool")
+    parser.add_argument("--analysis-backlog", type=int, default=16, help="pending analyses per game")
+    parser.add_argument(
+        "--analysis-backlog-policy",
+        choices=["coalesce", "drop"],
+        default="coalesce",
+        help="on a full backlog",
+    )
+    parser.add_argument(
+        "--history-budget", type=int, default=3000, help="chat history tokens of simulations, 0 for no limit"
+    )
+    parser.add_argument(
+        "--analysis-history-budget",
+        type=int,
+        default=2000,
+        help="chat history tokens of four-sides analyses, 0 for no limit",
+    )
+    parser.add_argument(
+        "--no-summary", action="store_true", help="send the full history instead of a rolling summary"
+    )
+    parser.add_argument(
+        "--summary-interval", type=int, default=8, help="new messages that trigger a summary update"
+    )
+    parser.add_argument(
+        "--no-streaming", action="store_true", help="wait for complete simulations instead of streaming them"
+    )
+    parser.add_argument(
+        "--prewarm-lead", type=float, default=3.0, help="seconds proactive messages are generated ahead"
+    )
+    parser.add_argument(
+        "--fixed-horizon", action="store_true", help="always simulate the full horizon of the reply tier"
+    )
+    parser.add_argument(
+        "--reply-budget", type=float, default=15.0, help="p95 reply delay regarded as human-like"
+    )
+    parser.add_argument(
+        "--llm-cache",
+        choices=["off", "read_write", "record", "replay"],
+        default="off",
+        help="LLM response cache mode",
+    )
+    parser.add_argument("--llm-cache-path", default=None, help="on-disk tier of the response cache")
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=FACTOR",
+        help="scale the LLM latency of a model, e.g. of the fast reply tier",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json-out", default=None, help="write all round results to this file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args: argparse.Namespace = parse_args()
+    # must be set before the bot modules create their loggers
+    os.environ["LOG_LEVEL"] = args.log_level
+
+    corpus: List[ReplayGame] = load_corpus()
+    results: List[Dict[str, Any]] = []
+    for num_games in [int(n) for n in args.games.split(",")]:
+        result: Dict[str, Any] = run_round(args, corpus, num_games)
+        print_report(result, args.reply_budget)
+        results.append(result)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
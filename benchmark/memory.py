@@ -0,0 +1,79 @@
+"""Memory footprint of the FourMind bot after thousands of started and ended games.
+
+Usage:
+    uv run python -m benchmark.memory --games 5000 --batch 500 --messages 3
+
+Games are started, fed a few messages and ended in batches, with analysis calls still in flight when a game
+ends. After every batch the traced heap size, live sessions and pending tasks are reported; all of them should
+stay flat once the first batch has warmed up the interpreter.
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import tracemalloc
+from datetime import datetime as DateTime
+from typing import Any
+
+from benchmark.fake_openai import FakeOpenAIServer, LatencyModel
+from benchmark.loadtest import ServerThread, cancel_pending
+
+
+async def play_batch(bot: Any, first_game_id: int, batch: int, num_messages: int) -> None:
+    players = ["Blue", "Red", "Yellow"]
+    for game_id in range(first_game_id, first_game_id + batch):
+        await bot.async_start_game(game_id, "Yellow", players, "en")
+    for game_id in range(first_game_id, first_game_id + batch):
+        session = await bot.sessions.get(game_id)
+        for i in range(num_messages):
+            await bot.new_message(session=session, message=f"message {i}", sender="Blue", time=DateTime.now())
+    await asyncio.sleep(0.1)  # let analysis calls start
+    for game_id in range(first_game_id, first_game_id + batch):
+        await bot.async_end_game(game_id)
+    await asyncio.sleep(1.0)  # let cancelled tasks and their http requests unwind
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--games", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=3, help="messages per game")
+    parser.add_argument("--log-level", default="ERROR")
+    args: argparse.Namespace = parser.parse_args()
+    os.environ["LOG_LEVEL"] = args.log_level
+
+    from fourmind.bot.client import FourMind
+    from fourmind.bot.models.session import GameSession
+
+    servers = ServerThread()
+    openai_server = FakeOpenAIServer(latency=LatencyModel.parse("fixed:0.05"))
+    openai_url: str = servers.run(openai_server.start())
+    bot = FourMind(turinggame_api_key="0" * 36, openai_api_key="sk-benchmark", openai_base_url=openai_url)
+
+    async def run() -> None:
+        print(f"{'games':>8}{'heap KiB':>12}{'sessions':>10}{'registry':>10}{'tasks':>8}")
+        for first_game_id in range(0, args.games, args.batch):
+            await play_batch(bot, first_game_id, args.batch, args.messages)
+            gc.collect()
+            heap, _ = tracemalloc.get_traced_memory()
+            sessions: int = sum(isinstance(o, GameSession) for o in gc.get_objects())
+            print(
+                f"{first_game_id + args.batch:>8}{heap / 1024:>12.0f}{sessions:>10}"
+                f"{len(bot.sessions):>10}{len(asyncio.all_tasks()) - 1:>8}"
+            )
+        await cancel_pending()
+        await bot.oai_client.close()
+
+    tracemalloc.start()
+    asyncio.get_event_loop().run_until_complete(run())
+    tracemalloc.stop()
+
+    servers.run(openai_server.stop())
+    servers.close()
+
+
+if __name__ == "__main__":
+    main()
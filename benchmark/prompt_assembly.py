@@ -0,0 +1,101 @@
+"""Prompt assembly time of the chat history for chats of growing length.
+
+Usage:
+    uv run python -m benchmark.prompt_assembly --sizes 50,200,1000 --rounds 200
+
+Every round appends one message to a chat, enriches the previous one and renders the full history, which is
+what each analysis and lookahead call does per incoming message. The cached rendering of `Chat` is compared
+to rendering every message from scratch with its own clock reading, as the bot did before the render cache.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime as DateTime
+from datetime import timedelta as TimeDelta
+from typing import Callable, List
+
+from benchmark.corpus import load_corpus
+from fourmind.bot.models.chat import Chat, ChatMessage, RichChatMessage
+from fourmind.bot.models.inference import FourSidesAnalysis
+
+SENDERS: List[str] = ["Blue", "Red", "Yellow"]
+
+
+def render_uncached(chat: Chat) -> str:
+    """Rendering without the cache: every message is formatted from scratch and reads the clock itself."""
+    messages: List[str] = [
+        message._format(message.format_time(), simple=False)
+        for message in chat.get_last_n_messages(chat.last_message_id)[::-1]
+    ]
+    return Chat.__str_template__.format(
+        start_time=chat.start_time.strftime("%Y-%m-%d %H:%M:%S"), messages="\n".join(messages)
+    )
+
+
+def build_chat(size: int, texts: List[str]) -> Chat:
+    """A chat of `size` analyzed messages spread over the last 20 minutes."""
+    now: DateTime = DateTime.now()
+    chat = Chat(id=0, players=SENDERS, bot=SENDERS[-1], language="en", start_time=now - TimeDelta(minutes=20))
+    for i in range(size):
+        message = ChatMessage(
+            id=i,
+            sender=random.choice(SENDERS),
+            message=random.choice(texts),
+            time=now - TimeDelta(seconds=1200 * (size - i) / size),
+        )
+        chat.add_message(RichChatMessage.from_base(message, analyze(message, texts)))
+    return chat
+
+
+def analyze(message: ChatMessage, texts: List[str]) -> FourSidesAnalysis:
+    return FourSidesAnalysis(
+        sender=message.sender,
+        factual_information=" ".join(random.choices(texts, k=3)),
+        self_revelation=" ".join(random.choices(texts, k=3)),
+        relationship=" ".join(random.choices(texts, k=3)),
+        appeal=" ".join(random.choices(texts, k=3)),
+        receivers=random.sample(SENDERS, k=2),
+    )
+
+
+def measure(chat: Chat, texts: List[str], rounds: int, render: Callable[[Chat], str]) -> float:
+    """Mean seconds per round of appending, enriching and rendering."""
+    elapsed: float = 0.0
+    for _ in range(rounds):
+        message = ChatMessage(
+            id=len(chat.messages),
+            sender=random.choice(SENDERS),
+            message=random.choice(texts),
+            time=DateTime.now(),
+        )
+        chat.add_message(message)
+        previous: ChatMessage = chat.messages[-2]
+        chat.add_message(RichChatMessage.from_base(previous, analyze(previous, texts)))
+
+        start: float = time.perf_counter()
+        render(chat)
+        elapsed += time.perf_counter() - start
+    return elapsed / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", default="50,200,1000", help="comma separated chat lengths")
+    parser.add_argument("--rounds", type=int, default=200, help="incoming messages per chat")
+    args: argparse.Namespace = parser.parse_args()
+
+    texts: List[str] = [m.message for game in load_corpus() for m in game.messages] or ["hello there"]
+    print(f"{'messages':>10}{'uncached ms':>14}{'cached ms':>12}{'speedup':>10}")
+    for size in [int(n) for n in args.sizes.split(",")]:
+        random.seed(size)
+        uncached: float = measure(build_chat(size, texts), texts, args.rounds, render_uncached)
+        random.seed(size)
+        cached: float = measure(build_chat(size, texts), texts, args.rounds, Chat.get_formatted_chat_history)
+        print(f"{size:>10}{uncached * 1000:>14.3f}{cached * 1000:>12.3f}{uncached / cached:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Message ingest throughput of the FourMind bot for a growing number of concurrent games.
+
+Usage:
+    uv run python -m benchmark.throughput --games 1,10,100,500 --messages 50
+
+Every round starts the given number of games and lets one producer per game push messages through the
+same path `async_on_message` uses for incoming human messages: chat lookup, message id assignment and
+analysis enqueue.
+The four-sides analysis workers run concurrently against the local OpenAI stand-in.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Dict, List
+
+from benchmark.fake_openai import FakeOpenAIServer, LatencyModel
+from benchmark.loadtest import ServerThread, cancel_pending
+from fourmind.bot.common.metrics import Metrics
+
+
+async def produce(bot: Any, game_id: int, sender: str, num_messages: int) -> None:
+    from fourmind.bot.models.session import GameSession
+
+    for i in range(num_messages):
+        start: float = time.perf_counter()
+        session: GameSession | None = await bot.sessions.get(game_id)
+        if session is None:
+            return
+        await bot.new_message(
+            session=session, message=f"message {i}", sender=sender, time=session.chat.last_message_time
+        )
+        Metrics.observe("ingest.latency", time.perf_counter() - start)
+        await asyncio.sleep(0)
+
+
+def run_round(args: argparse.Namespace, openai_url: str, num_games: int) -> Dict[str, Any]:
+    from fourmind.bot.client import FourMind
+
+    Metrics.reset()
+    bot = FourMind(turinggame_api_key="0" * 36, openai_api_key="sk-benchmark", openai_base_url=openai_url)
+    players: List[str] = ["Blue", "Red", "Yellow"]
+
+    async def main() -> float:
+        for game_id in range(num_games):
+            await bot.async_start_game(game_id, "Yellow", players, "en")
+        start: float = time.perf_counter()
+        await asyncio.gather(*(produce(bot, game_id, "Blue", args.messages) for game_id in range(num_games)))
+        elapsed: float = time.perf_counter() - start
+
+        await bot.oai_client.close()
+        await cancel_pending()
+        return elapsed
+
+    elapsed: float = asyncio.get_event_loop().run_until_complete(main())
+    total: int = num_games * args.messages
+    return {
+        "games": num_games,
+        "messages": total,
+        "elapsed": elapsed,
+        "throughput": total / elapsed,
+        "latency": Metrics.percentiles("ingest.latency"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--games", default="1,10,100,500", help="comma separated concurrent game counts")
+    parser.add_argument("--messages", type=int, default=50, help="messages per game")
+    parser.add_argument("--llm-latency", default="fixed:0.5", help="latency of the analysis calls")
+    parser.add_argument("--log-level", default="WARNING")
+    args: argparse.Namespace = parser.parse_args()
+    os.environ["LOG_LEVEL"] = args.log_level
+
+    servers = ServerThread()
+    openai_server = FakeOpenAIServer(latency=LatencyModel.parse(args.llm_latency))
+    openai_url: str = servers.run(openai_server.start())
+
+    run_round(args, openai_url, 1)  # warm up the OpenAI client and its connection pool
+    print(f"{'games':>8}{'messages':>10}{'elapsed s':>12}{'msg/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for num_games in [int(n) for n in args.games.split(",")]:
+        result: Dict[str, Any] = run_round(args, openai_url, num_games)
+        latency: Dict[str, float] = result["latency"]
+        print(
+            f"{result['games']:>8}{result['messages']:>10}{result['elapsed']:>12.3f}{result['throughput']:>12.0f}"
+            f"{latency['p50'] * 1000:>10.3f}{latency['p99'] * 1000:>10.3f}"
+        )
+
+    servers.run(openai_server.stop())
+    servers.close()
+
+
+if __name__ == "__main__":
+    main()
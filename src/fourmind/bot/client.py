@@ -5,28 +5,57 @@ import platform
 import random
 import signal
 import time
+from collections import deque
 from datetime import datetime as DateTime
 from datetime import timedelta as TimeDelta
 from logging import Logger
-from typing import Any, Dict, List, override
+from typing import Any, Deque, List, Tuple, override
 
 import websockets
 from openai import AsyncOpenAI
 from turing_bot_client import TuringBotClient  # type: ignore
 from turing_bot_client.TuringBotClient import APIKeyMessage  # type: ignore
 
+from fourmind.bot.common.backoff import ExponentialBackoff
 from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.branch import SimulatedBranch
 from fourmind.bot.models.chat import Chat, ChatMessage, GameID
-from fourmind.bot.models.storage import ChatStorage
+from fourmind.bot.models.outbound import OutboundMessage
+from fourmind.bot.models.session import GameSession
 from fourmind.bot.services.analysis.four_sides import FourSidesQueue
+from fourmind.bot.services.analysis.summarizer import ConversationSummarizer
+from fourmind.bot.services.llm_gateway import LLMGateway
+from fourmind.bot.services.response_cache import CacheMode, ResponseCache
+from fourmind.bot.services.response_generation.generation_supervisor import GenerationSupervisor
 from fourmind.bot.services.response_generation.lookahead import Lookahead
 from fourmind.bot.services.response_generation.message_time_simulator import MessageTimeSimulator
+from fourmind.bot.services.response_generation.prediction import BranchPredictor
+from fourmind.bot.services.response_generation.reply_planner import ReplyPlan, ReplyPlanner
+from fourmind.bot.services.scheduling.deadline_scheduler import DeadlineScheduler
+from fourmind.bot.services.scheduling.outbound_scheduler import OutboundScheduler
 from fourmind.bot.services.storage.storage_handler import StorageHandler
 
 
 class FourMind(TuringBotClient):
     DEFAULT_LANGUAGE: str = "en"
     BOT_NAME: str = "FourMind"
+    DEFAULT_ENDPOINT: str = "wss://play.turinggame.ai"
+
+    # proactive behaviour
+    GAME_TIMEOUT: TimeDelta = TimeDelta(minutes=20)
+    GREETING_DELAY: float = 2.0
+    EARLY_GAME_MESSAGES: int = 6
+    EARLY_IDLE_THRESHOLD: TimeDelta = TimeDelta(seconds=10)
+    LATE_IDLE_THRESHOLD: TimeDelta = TimeDelta(seconds=30)
+    LATE_PROACTIVE_PROBABILITY: float = 0.7
+    PROACTIVE_RETRY_DELAY: float = 4.0
+    PROACTIVE_COOLDOWN: float = 10.0
+    # the proactive message is generated this many seconds before the idle deadline, 0 disables pre-warming
+    PREWARM_LEAD: float = 3.0
+
+    # seconds an ended game may wait for its analysis in flight before it is cancelled
+    TEARDOWN_TIMEOUT: float = 5.0
 
     logger: Logger = LoggerFactory.setup_logger(__name__)
     __event_loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
@@ -38,25 +67,46 @@ class FourMind(TuringBotClient):
         bot_name: str = BOT_NAME,
         language: str = DEFAULT_LANGUAGE,
         persist_chats: bool = False,
+        endpoint: str = DEFAULT_ENDPOINT,
+        openai_base_url: str | None = None,
+        response_cache: ResponseCache | None = None,
     ) -> None:
-        super().__init__(api_key=turinggame_api_key, bot_name=bot_name, languages=language)  # type: ignore
+        super().__init__(  # type: ignore
+            api_key=turinggame_api_key, bot_name=bot_name, languages=language, endpoint=endpoint
+        )
 
-        self.oai_client: AsyncOpenAI = AsyncOpenAI(api_key=openai_api_key)
+        self.oai_client: AsyncOpenAI = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url)
         self.persist_chats: bool = persist_chats
         self.logger.info(f"Persist chats is set to '{persist_chats}'")
-        self.lock = asyncio.Lock()
 
-        self.__storage = ChatStorage()
-        self.chats: StorageHandler = StorageHandler(storage=self.__storage, persist=persist_chats)
-        self.queues: FourSidesQueue = FourSidesQueue(storage=self.__storage, client=self.oai_client)
-        self.response_generator: Lookahead = Lookahead(client=self.oai_client)
+        # registry of all per-game state, see GameSession
+        self.sessions: StorageHandler = StorageHandler(persist=persist_chats)
+        # all LLM calls share one gateway for concurrency limits, rate limits and priorities
+        self.gateway: LLMGateway = LLMGateway()
+        # exact-match cache of LLM responses, off unless configured
+        self.response_cache: ResponseCache = response_cache or ResponseCache(CacheMode.OFF, path=None)
+        self.queues: FourSidesQueue = FourSidesQueue(
+            client=self.oai_client, gateway=self.gateway, cache=self.response_cache
+        )
+        self.summarizer: ConversationSummarizer = ConversationSummarizer(
+            client=self.oai_client, gateway=self.gateway, cache=self.response_cache
+        )
+        self.response_generator: Lookahead = Lookahead(
+            client=self.oai_client, gateway=self.gateway, cache=self.response_cache
+        )
+        # continuations simulated with each reply, served if the humans follow them
+        self.predictor: BranchPredictor = BranchPredictor()
+        self.generation: GenerationSupervisor = GenerationSupervisor(self.response_generator, self.predictor)
+        self.planner: ReplyPlanner = ReplyPlanner()
         self.mts = MessageTimeSimulator()
+        self.scheduler: DeadlineScheduler = DeadlineScheduler()
+        # messages of the bot wait for their simulated typing delay here instead of in a sleeping task
+        self.outbound: OutboundScheduler = OutboundScheduler(self.scheduler, self.deliver_async)
 
-        # indicates whether a message generation is currently running
-        self.response_generation_lock: Dict[GameID, int] = {}
-
-        # temp buffer for cutted messages
-        self.followup_message: Dict[GameID, str] = {}
+        # connection handling, games outlive a dropped connection
+        self.backoff: ExponentialBackoff = ExponentialBackoff()
+        self.outbox: Deque[Tuple[GameID, str]] = deque()  # game messages that could not be sent while offline
+        self.disconnected_at: float | None = None
 
     # Override Methods (5)
 
@@ -69,73 +119,119 @@ class FourMind(TuringBotClient):
         language: str,
     ) -> bool:
         """Override method to implement game start logic."""
+        if await self.sessions.get(game_id) is not None:
+            # the server replays running games after a reconnect, keep the existing state
+            self.logger.info(f"Resuming game {self.anonymize_id(game_id)} after reconnect")
+            return True
         chat: Chat = Chat(id=game_id, players=players_list, bot=bot, language=language)
-        await self.chats.add(chat)
-        self.queues.add_queue(game_id)
-        self.response_generation_lock[game_id] = 0
-
-        self.__event_loop.create_task(self.start_proactive_loop_async(game_id))
+        session: GameSession = GameSession(chat)
+        await self.sessions.add(session)
+        self.start_timers(session)
         return True
 
     @override
     async def async_on_message(self, game_id: int, message: str, player: str, bot: str) -> str | None:  # type: ignore
         incoming_message_start_time: DateTime = DateTime.now()
 
-        chat_ref: Chat | None = await self.chats.get(game_id)
-        if chat_ref is None:
+        session: GameSession | None = await self.sessions.get(game_id)
+        if session is None:
             self.logger.error(f"Chat with ID {self.anonymize_id(game_id)} not found in storage")
             return None
+        chat_ref: Chat = session.chat
 
+        incoming: ChatMessage | None = None
         if player != bot:
-            await self.new_message(
-                chat_ref=chat_ref,
-                game_id=game_id,
+            incoming = await self.new_message(
+                session=session,
                 message=message,
                 sender=player,
                 time=incoming_message_start_time,
             )
-
-        if self.response_generation_lock.get(game_id) == 1:
-            self.logger.info(f"{str(chat_ref)} Message generation already in progress")
-            return None
-        self.response_generation_lock[game_id] = 1
-
-        # response handling logic
-        if self.followup_message.get(game_id) is not None:
-            self.logger.debug(f"Followup message found for {self.anonymize_id(game_id)}")
-            response = self.followup_message.pop(game_id)
+            if incoming is not None:
+                # the messages the bot is still typing were written without the new message
+                self.outbound.withdraw(session, before_id=incoming.id)
+        elif self.outbound.pending(session):
+            return None  # the bot's own message, its follow-up is already queued
+
+        # response handling logic, every message supersedes the generation still in flight
+        branch: SimulatedBranch | None = None  # continuation simulated with the response
+        predicted: str | None
+        response: str | None
+
+        def accept(reply: str) -> bool:
+            """The filter of `post_process_message`, a predicted or generated reply must pass it."""
+            return self.accepts_reply(reply, session)
+
+        if incoming is not None and (predicted := self.predictor.match(session, incoming, accept)):
+            # the humans follow the simulation of the previous reply, its answer is served without an LLM call
+            response = predicted
+            branch = session.branch
+            self.generation.supersede(session)
         else:
-            response: str | None = await self.response_generator.simulate_chat_async(chat_ref)
+            # bounded by the time a human would take to answer, the tier is chosen to fit into this budget
+            # and slow completions are hedged or given up
+            budget: float = self.mts.get_response_budget(incoming_message_start_time, chat_ref)
+            Metrics.observe("generation.budget", budget)
+            plan: ReplyPlan = self.planner.plan(chat_ref, budget)
+            if plan.template is not None:
+                self.generation.supersede(session)
+                self.predictor.discard(session)
+                response = plan.template
+            else:
+                response = await self.generation.generate(
+                    session,
+                    timeout=budget,
+                    plan=plan,
+                    accept=accept,
+                )
+                branch = session.branch
+            self.planner.report(
+                plan,
+                (DateTime.now() - incoming_message_start_time).total_seconds(),
+                completed=response is not None,
+            )
 
         if response is None:
-            self.response_generation_lock[game_id] = 0
+            Metrics.increment("on_message.no_reply")
             return None
 
-        response_message: str | None = self.post_process_message(response, game_id, bot)
+        response_message: str | None = self.post_process_message(response, session)
+        followup: str | None = session.followup_message
+        session.followup_message = None
         if response_message is None:
-            self.response_generation_lock[game_id] = 0
+            Metrics.increment("on_message.no_reply")
             return None
+        Metrics.observe(
+            "on_message.generation", (DateTime.now() - incoming_message_start_time).total_seconds()
+        )
 
+        # sent by the outbound scheduler once the typing delay has passed, unless a newer message comes first
         remaining_response_time: float = self.mts.calculate_remaining_response_time(
             incoming_message_start_time, response_message, chat_ref
         )
-        await asyncio.sleep(remaining_response_time)
-        await self.new_message(
-            chat_ref=chat_ref,
-            game_id=game_id,
-            message=response_message,
-            sender=bot,
-            time=DateTime.now(),
+        self.outbound.enqueue(
+            session,
+            response_message,
+            remaining_response_time,
+            "reply",
+            origin=incoming_message_start_time,
+            branch=branch,
+            followup=followup,
         )
-        self.response_generation_lock[game_id] = 0
-        return response_message
+        return None
 
     @override
     async def async_end_game(self, game_id: int) -> None:
         """Override method to implement game end logic"""
-        await self.chats.remove(game_id)
-        await self.queues.dequeue_and_cancel_async(game_id)
-        self.response_generation_lock.pop(game_id, None)
+        start: float = time.perf_counter()
+        session: GameSession | None = await self.sessions.remove(game_id)
+        if session is None:
+            return None
+        session.active = False  # no further messages, proactive behaviour or analysis batches
+        await self.queues.drain_async(session, timeout=self.TEARDOWN_TIMEOUT)
+        session.close()
+        self.sessions.finalize(session)
+        Metrics.observe("teardown.duration", time.perf_counter() - start)
 
     @override
     def start(self) -> None:
@@ -194,6 +290,7 @@ class FourMind(TuringBotClient):
                     response = await self._receive()
                     if response["type"] == "info":
                         self.logger.debug(f"Server Response: {response['message']}")
+                    await self.on_connected()
                     await self._main_loop()
 
             except websockets.exceptions.ConnectionClosedOK as e:
@@ -212,21 +309,50 @@ class FourMind(TuringBotClient):
                     await self._on_shutdown(send_shutdown=False)
                 else:
                     self.logger.debug("Game currently not reachable, waiting to reconnect...")
-                    # time.sleep(5)
-                    continue
+                    await self.wait_before_reconnect()
 
             except ConnectionRefusedError:
                 self.logger.debug("Connection refused, retry...")
-                time.sleep(5)
-                continue
+                await self.wait_before_reconnect()
             except websockets.exceptions.InvalidStatus:
                 self.logger.debug("Connection refused, retry...")
-                time.sleep(5)
-                continue
+                await self.wait_before_reconnect()
             except Exception as e:
                 self.logger.exception(f"Unexpected error: {e}")
-                time.sleep(5)
-                continue
+                await self.wait_before_reconnect()
+
+    async def wait_before_reconnect(self) -> None:
+        """Sleep for the next backoff delay without blocking the running games."""
+        if self.disconnected_at is None:
+            self.disconnected_at = time.perf_counter()
+        delay: float = self.backoff.next_delay()
+        self.logger.debug(f"Reconnect attempt {self.backoff.attempts} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def on_connected(self) -> None:
+        """Finish a (re)connect: reset the backoff and flush messages buffered while offline."""
+        self.backoff.reset()
+        if self.disconnected_at is not None:
+            Metrics.observe("connection.reconnect_latency", time.perf_counter() - self.disconnected_at)
+            Metrics.increment("connection.reconnects")
+            self.disconnected_at = None
+        for _ in range(len(self.outbox)):  # messages failing again are re-buffered for the next connect
+            game_id, message = self.outbox.popleft()
+            if await self.sessions.get(game_id) is None:
+                continue  # game ended in the meantime
+            await self.send_game_message(game_id, message)
+
+    @override
+    async def send_game_message(self, game_id: int, message: str) -> None:
+        """Send a game message, buffering it if the connection is down."""
+        if not message:
+            return None
+        try:
+            await super().send_game_message(game_id, message)
+        except websockets.exceptions.ConnectionClosed:
+            self.logger.debug(f"Connection down, buffering message for {self.anonymize_id(game_id)}")
+            self.outbox.append((game_id, message))
+            Metrics.increment("connection.buffered_messages")
 
     @override
     def on_gamemaster_message(self, game_id: int, message: str, player: str, bot: str) -> None:
@@ -243,13 +369,22 @@ class FourMind(TuringBotClient):
 
     async def new_message(
         self,
-        chat_ref: Chat,
-        game_id: GameID,
+        session: GameSession,
         message: str,
         sender: str,
         time: DateTime,
-    ) -> None:
-        async with self.lock:
+    ) -> ChatMessage | None:
+        """Add a message to the chat and enqueue its analysis.
+
+        Returns:
+            ChatMessage | None: the added message, or None if the game has already ended.
+        """
+        if not session.active:
+            self.logger.warning(f"{str(session)} Dropping message for ended game")
+            return None
+
+        async with session.message_lock:
+            chat_ref: Chat = session.chat
             chat_message: ChatMessage = ChatMessage(
                 id=len(chat_ref.messages),
                 sender=sender,
@@ -257,7 +392,10 @@ class FourMind(TuringBotClient):
                 time=time,
             )
             chat_ref.add_message(chat_message)
-            await self.queues.enqueue_item_async(game_id, chat_message.id)
+            self.reschedule_idle_timer(session)
+            await self.queues.enqueue_item_async(session, chat_message.id)
+            self.summarizer.refresh_if_due(session)
+        return chat_message
 
     @staticmethod
     def anonymize_id(game_id: int) -> str:
@@ -272,95 +410,202 @@ class FourMind(TuringBotClient):
 
     FORBIDDEN_WORDS: List[str] = ["nah ", "i think ", "i mean ", "just ", "like ", "kinda ", "sort of "]
 
-    def post_process_message(self, message: str, game_id: int, bot: str) -> str | None:
+    def post_process_message(self, message: str, session: GameSession) -> str | None:
         """Cut the response at the first comma and filter forbidden words."""
         # failsave since bot tends to repeat itself
-        current_chat: Chat | None = self.__storage.chats.get(game_id)
-        if current_chat is not None:
-            previous_messages: List[str] = [
-                msg.message.lower() for msg in current_chat.get_last_n_messages(3) if msg.sender == bot
-            ]
-            if message.lower() in previous_messages:
-                return None
+        if self.is_repetition(message, session):
+            return None
 
-        for word in self.FORBIDDEN_WORDS:
-            message = message.replace(word, "")
+        message = self.strip_forbidden_words(message)
 
         split_message = message.split(", ")
         if len(split_message) == 1 or random.random() < 0.5:
             return message
         elif len(split_message) > 1 and random.random() < 0.5:
-            self.followup_message[game_id] = split_message[1]
+            session.followup_message = split_message[1]
             return split_message[0]
         return message.split(", ")[0].split(". ")[0]
 
-    async def start_proactive_loop_async(self, game_id: int) -> None:
-        """"""
-        await asyncio.sleep(2)
-        chat: Chat | None = await self.chats.get(game_id)
+    def accepts_reply(self, message: str, session: GameSession) -> bool:
+        """Whether `post_process_message` would deliver anything for the generated `message`."""
+        return not self.is_repetition(message, session) and bool(self.strip_forbidden_words(message).strip())
 
-        while chat:
-            if TimeDelta(minutes=20) < DateTime.now() - chat.start_time:
-                self.logger.info(f"Ending game for {self.anonymize_id(game_id)} due to timeout")
-                await self.async_end_game(game_id)
-                break
+    def is_repetition(self, message: str, session: GameSession) -> bool:
+        current_chat: Chat = session.chat
+        previous_messages: List[str] = [
+            msg.message.lower()
+            for msg in current_chat.get_last_n_messages(3)
+            if msg.sender == current_chat.bot
+        ]
+        return message.lower() in previous_messages
 
-            if len(chat.messages) < 6:
-                proactive_condition: bool = (
-                    DateTime.now() - chat.last_message_time > TimeDelta(seconds=10)
-                    and self.response_generation_lock[game_id] == 0
-                )
-            else:
-                proactive_condition: bool = (
-                    DateTime.now() - chat.last_message_time > TimeDelta(seconds=30)
-                    and random.random() < 0.7
-                    and self.response_generation_lock[game_id] == 0
-                )
+    def strip_forbidden_words(self, message: str) -> str:
+        for word in self.FORBIDDEN_WORDS:
+            message = message.replace(word, "")
+        return message
 
-            # start chat proactively
-            if (
-                chat.last_message_id == 0
-                and random.random() < 0.5
-                and self.response_generation_lock[game_id] == 0
-            ):
-                self.response_generation_lock[game_id] = 1
-                start_message: str = random.choice(["hi", "hello", "hi there"])
-                remaining_response_time: float = self.mts.calculate_remaining_response_time(
-                    chat.start_time, start_message, chat
-                )
-                await asyncio.sleep(remaining_response_time)
-                await self.new_message(
-                    chat_ref=chat,
-                    game_id=game_id,
-                    message=start_message,
-                    sender=chat.bot,
-                    time=DateTime.now(),
-                )
-                self.response_generation_lock[game_id] = 0
-                await self.send_game_message(game_id, start_message)  # type: ignore
-
-            # if too much time has passed since the last message, send a proactive message
-            elif proactive_condition:
-                self.response_generation_lock[game_id] = 1
-                self.logger.info(f"Proactive loop for {self.anonymize_id(game_id)}")
-                response: str | None = await self.response_generator.simulate_chat_async(chat, proactive=True)
-                if response is not None:
-                    self.logger.debug(f"Proactive message: {response}")
-                    await self.new_message(
-                        chat_ref=chat,
-                        game_id=game_id,
-                        message=response,
-                        sender=chat.bot,
-                        time=DateTime.now(),
-                    )
-                    await self.send_game_message(game_id, response)
-                self.response_generation_lock[game_id] = 0
-                await asyncio.sleep(10)
-
-            await asyncio.sleep(4)
-            chat: Chat | None = await self.chats.get(game_id)
-
-        self.logger.info(f"Proactive loop ended for {self.anonymize_id(game_id)}")
+    # Proactive behaviour, driven by deadlines of the shared scheduler
+
+    def start_timers(self, session: GameSession) -> None:
+        """Arm the timeout, greeting and idle deadlines of a new game."""
+        chat: Chat = session.chat
+        session.timeout_timer = self.scheduler.schedule_at(
+            chat.start_time + self.GAME_TIMEOUT, lambda: self.on_game_timeout(session)
+        )
+        # the greeting is attempted with probability 0.5 every retry interval, so draw the attempt up front
+        greeting_delay: float = self.GREETING_DELAY
+        while random.random() >= 0.5:
+            greeting_delay += self.PROACTIVE_RETRY_DELAY
+        session.greeting_timer = self.scheduler.schedule_in(
+            greeting_delay, lambda: self.on_greeting_deadline(session)
+        )
+        self.reschedule_idle_timer(session)
+
+    def reschedule_idle_timer(self, session: GameSession, delay: float | None = None) -> None:
+        """Move the idle deadline, by default relative to `Chat.last_message_time`.
+
+        A proactive message generated ahead of the previous deadline is outdated and discarded.
+        """
+        if not session.active:
+            return
+        if session.idle_timer is not None:
+            session.idle_timer.cancel()
+        self.invalidate_prewarm(session)
+        if delay is None:
+            chat: Chat = session.chat
+            threshold: TimeDelta = (
+                self.EARLY_IDLE_THRESHOLD
+                if len(chat.messages) < self.EARLY_GAME_MESSAGES
+                else self.LATE_IDLE_THRESHOLD
+            )
+            delay = (chat.last_message_time + threshold - DateTime.now()).total_seconds()
+        session.idle_timer = self.scheduler.schedule_in(delay, lambda: self.on_idle_deadline(session))
+        if self.PREWARM_LEAD > 0:
+            session.prewarm_timer = self.scheduler.schedule_in(
+                delay - self.PREWARM_LEAD, lambda: self.on_prewarm_deadline(session)
+            )
+
+    def invalidate_prewarm(self, session: GameSession) -> None:
+        if session.prewarm_timer is not None:
+            session.prewarm_timer.cancel()
+            session.prewarm_timer = None
+        prewarm: asyncio.Task[str | None] | None = session.prewarm_task
+        if prewarm is None:
+            return
+        session.prewarm_task = None
+        if not prewarm.done():
+            prewarm.cancel()
+            Metrics.increment("proactive.prewarm.cancelled")  # no candidate yet, cut short by the new message
+        elif not prewarm.cancelled() and prewarm.exception() is None and prewarm.result() is not None:
+            Metrics.increment("proactive.prewarm.wasted")  # a generated message that is never sent
+
+    def on_game_timeout(self, session: GameSession) -> None:
+        session.timeout_timer = None
+        self.logger.info(f"Ending game for {self.anonymize_id(session.id)} due to timeout")
+        asyncio.create_task(self.async_end_game(session.id))
+
+    def on_greeting_deadline(self, session: GameSession) -> None:
+        session.greeting_timer = None
+        if not session.active or session.chat.last_message_id != 0:
+            return
+        if self.is_busy(session):
+            session.greeting_timer = self.scheduler.schedule_in(
+                self.PROACTIVE_RETRY_DELAY, lambda: self.on_greeting_deadline(session)
+            )
+            return
+        chat: Chat = session.chat
+        start_message: str = random.choice(["hi", "hello", "hi there"])
+        remaining_response_time: float = self.mts.calculate_remaining_response_time(
+            chat.start_time, start_message, chat
+        )
+        self.outbound.enqueue(
+            session, start_message, remaining_response_time, "greeting", origin=chat.start_time
+        )
+
+    def on_prewarm_deadline(self, session: GameSession) -> None:
+        """Start generating the proactive message shortly before the idle deadline."""
+        session.prewarm_timer = None
+        if not session.active or self.is_busy(session):
+            return  # decided at the idle deadline
+        late_game: bool = len(session.chat.messages) >= self.EARLY_GAME_MESSAGES
+        if late_game and random.random() >= self.LATE_PROACTIVE_PROBABILITY:
+            # same retry as if the idle deadline had decided against a proactive message
+            self.reschedule_idle_timer(session, delay=self.PREWARM_LEAD + self.PROACTIVE_RETRY_DELAY)
+            return
+        Metrics.increment("proactive.prewarm.started")
+        # runs as the session's generation, so a new message supersedes it
+        session.prewarm_task = asyncio.create_task(self.generation.generate(session, proactive=True))
+
+    def on_idle_deadline(self, session: GameSession) -> None:
+        session.idle_timer = None
+        if not session.active:
+            return
+        prewarm: asyncio.Task[str | None] | None = session.prewarm_task
+        if prewarm is not None and not session.generating and not self.outbound.pending(session):
+            session.prewarm_task = None  # handed over, no longer invalidated by new messages
+            Metrics.increment("proactive.prewarm.served")
+            Metrics.increment("proactive.prewarm.ready" if prewarm.done() else "proactive.prewarm.pending")
+            session.generating = True
+            session.proactive_task = asyncio.create_task(self.send_proactive_message_async(session, prewarm))
+            return
+        late_game: bool = len(session.chat.messages) >= self.EARLY_GAME_MESSAGES
+        if self.is_busy(session) or (late_game and random.random() >= self.LATE_PROACTIVE_PROBABILITY):
+            self.reschedule_idle_timer(session, delay=self.PROACTIVE_RETRY_DELAY)
+            return
+        session.generating = True
+        session.proactive_task = asyncio.create_task(self.send_proactive_message_async(session))
+
+    def is_busy(self, session: GameSession) -> bool:
+        """Whether a message of the bot is being generated or waits for its send deadline."""
+        return session.generating or session.generation_task is not None or self.outbound.pending(session)
+
+    async def send_proactive_message_async(
+        self, session: GameSession, prewarm: asyncio.Task[str | None] | None = None
+    ) -> None:
+        """If too much time has passed since the last message, send a proactive message.
+
+        Args:
+            prewarm: the generation of the proactive message started ahead of the idle deadline, if any.
+        """
+        self.logger.info(f"Proactive message for {self.anonymize_id(session.id)}")
+        try:
+            # superseded as soon as a new message arrives
+            start: float = time.perf_counter()
+            response: str | None = await (prewarm or self.generation.generate(session, proactive=True))
+            Metrics.observe("proactive.generation_wait", time.perf_counter() - start)
+            if response is not None:
+                self.logger.debug(f"Proactive message: {response}")
+                self.outbound.enqueue(session, response, 0.0, "proactive")
+        finally:
+            session.generating = False
+            session.proactive_task = None
+        # no further proactive attempt before the cooldown, a delivered message re-arms the idle deadline
+        if response is None:
+            self.reschedule_idle_timer(session, delay=self.PROACTIVE_COOLDOWN + self.PROACTIVE_RETRY_DELAY)
+
+    async def deliver_async(self, session: GameSession, outbound: OutboundMessage) -> None:
+        """Send a queued message of the bot once its deadline has passed, see `OutboundScheduler`."""
+        chat: Chat = session.chat
+        sent: ChatMessage | None = await self.new_message(
+            session=session,
+            message=outbound.message,
+            sender=chat.bot,
+            time=DateTime.now(),
+        )
+        if sent is None:
+            return None
+        self.predictor.delivered(session, outbound.branch, sent)
+        await self.send_game_message(session.id, outbound.message)
+        if outbound.kind == "reply":
+            Metrics.observe("on_message.latency", (DateTime.now() - outbound.origin).total_seconds())
+        elif outbound.kind == "proactive" and len(chat.messages) < self.EARLY_GAME_MESSAGES:
+            self.reschedule_idle_timer(session, delay=self.PROACTIVE_COOLDOWN + self.PROACTIVE_RETRY_DELAY)
+        if outbound.followup is not None:
+            # typed right after the first half, no longer waiting for the next message of the humans
+            followup_time: float = self.mts.calculate_remaining_response_time(
+                DateTime.now(), outbound.followup, chat
+            )
+            self.outbound.enqueue(session, outbound.followup, followup_time, "followup")
 
 
 def main() -> None:
@@ -380,11 +625,16 @@ def main() -> None:
         return None
 
     persist_chats: bool = bool(os.environ.get("PERSIST_CHATS", "False"))
+    response_cache = ResponseCache(
+        mode=CacheMode(os.environ.get("LLM_CACHE", CacheMode.OFF.value)),
+        path=os.environ.get("LLM_CACHE_PATH", ResponseCache.DEFAULT_PATH),
+    )
 
     bot: FourMind = FourMind(
         turinggame_api_key=turinggame_api_key,
         openai_api_key=openai_api_key,
         persist_chats=persist_chats,
+        response_cache=response_cache,
     )
     logger.info("FourMind bot created")
     bot.start()
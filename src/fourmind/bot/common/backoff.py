@@ -0,0 +1,28 @@
+"""Exponential backoff with jitter for retrying connections."""
+
+import random
+from dataclasses import dataclass
+
+__all__ = ["ExponentialBackoff"]
+
+
+@dataclass
+class ExponentialBackoff:
+    """Exponential backoff with "full jitter".
+
+    The n-th delay is drawn uniformly from [0, min(maximum, initial * multiplier ** n)], which spreads
+    reconnect attempts of many clients over time instead of letting them retry in lockstep.
+    """
+
+    initial: float = 0.5
+    maximum: float = 30.0
+    multiplier: float = 2.0
+    attempts: int = 0
+
+    def next_delay(self) -> float:
+        cap: float = min(self.maximum, self.initial * self.multiplier**self.attempts)
+        self.attempts += 1
+        return random.uniform(0, cap)
+
+    def reset(self) -> None:
+        self.attempts = 0
@@ -0,0 +1,88 @@
+"""Process-wide registry for latency samples and counters.
+
+The registry is intentionally dependency free so that the bot can record timings on its hot paths
+and the benchmark harness can read them back without any exporter being configured.
+"""
+
+import math
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Sequence
+
+__all__ = ["Metrics"]
+
+
+class Metrics:
+    """Registry of named sample series (e.g. latencies in seconds) and monotonic counters.
+
+    Each series keeps at most `MAX_SAMPLES` most recent values, so recording is O(1) and memory stays bounded
+    for long running bot processes.
+    """
+
+    MAX_SAMPLES: int = 50_000
+    DEFAULT_PERCENTILES: Sequence[float] = (50.0, 95.0, 99.0)
+
+    _samples: Dict[str, Deque[float]] = {}
+    _counters: Dict[str, float] = defaultdict(float)
+
+    @staticmethod
+    def observe(name: str, value: float) -> None:
+        """Record a sample for the series `name`."""
+        series: Deque[float] | None = Metrics._samples.get(name)
+        if series is None:
+            series = Metrics._samples.setdefault(name, deque(maxlen=Metrics.MAX_SAMPLES))
+        series.append(value)
+
+    @staticmethod
+    def increment(name: str, value: float = 1) -> None:
+        """Increase the counter `name` by `value`."""
+        Metrics._counters[name] += value
+
+    @staticmethod
+    @contextmanager
+    def timer(name: str) -> Iterator[None]:
+        """Context manager that records the wall time of its body in seconds."""
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            Metrics.observe(name, time.perf_counter() - start)
+
+    @staticmethod
+    def samples(name: str) -> List[float]:
+        return list(Metrics._samples.get(name, ()))
+
+    @staticmethod
+    def counter(name: str) -> float:
+        return Metrics._counters.get(name, 0)
+
+    @staticmethod
+    def percentiles(name: str, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        """Compute the given percentiles (nearest-rank) of the series `name`.
+
+        Returns:
+            Dict[str, float]: mapping like {"count": 10, "p50": 0.2, "p95": 0.9, "max": 1.1}.
+        """
+        values: List[float] = sorted(Metrics._samples.get(name, ()))
+        if not values:
+            return {"count": 0}
+        result: Dict[str, float] = {"count": len(values)}
+        for p in percentiles:
+            rank: int = max(0, math.ceil(p / 100.0 * len(values)) - 1)
+            result[f"p{p:g}"] = values[rank]
+        result["max"] = values[-1]
+        result["mean"] = sum(values) / len(values)
+        return result
+
+    @staticmethod
+    def snapshot() -> Dict[str, Dict[str, float]]:
+        """Summaries of all series plus all counters."""
+        snapshot: Dict[str, Dict[str, float]] = {name: Metrics.percentiles(name) for name in Metrics._samples}
+        snapshot["counters"] = dict(Metrics._counters)
+        return snapshot
+
+    @staticmethod
+    def reset() -> None:
+        Metrics._samples.clear()
+        Metrics._counters.clear()
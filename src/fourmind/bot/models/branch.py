@@ -0,0 +1,31 @@
+"""Runtime representation of a simulated continuation of a chat."""
+
+import asyncio
+from typing import List
+
+from fourmind.bot.models.inference import ChatSimulationMessage
+
+__all__ = ["SimulatedBranch"]
+
+
+class SimulatedBranch:
+    """The simulated continuation of a chat: the bot's reply, if the simulation starts with it, and the
+    messages predicted to follow it."""
+
+    __slots__ = ("reply", "upcoming", "after_id", "latency", "task")
+
+    def __init__(self, reply: str | None, upcoming: List[ChatSimulationMessage]) -> None:
+        self.reply: str | None = reply
+        self.upcoming: List[ChatSimulationMessage] = upcoming
+        self.after_id: int | None = None  # id of the real message the upcoming messages follow, once known
+        self.latency: float = 0.0  # seconds the simulation took until the reply
+        self.task: asyncio.Task[None] | None = None  # still streaming upcoming messages
+
+    @property
+    def streaming(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def discard(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.task = None
@@ -1,66 +1,109 @@
+"""Runtime representation of chats and their messages.
+
+Messages are created and enriched several times per incoming message, so the runtime uses plain slotted
+records with interned sender names. Pydantic models are only used at the persistence boundary,
+see `fourmind.bot.models.persistence`.
+"""
+
 import random
+import sys
 from datetime import datetime as DateTime
 from datetime import timedelta
-from typing import Dict, List
-
-from pydantic import BaseModel, Field
+from typing import Dict, List, Tuple
 
+from fourmind.bot.common.tokens import estimate_tokens
 from fourmind.bot.models.inference import FourSidesAnalysis
 from fourmind.bot.services.llm_inference import LLMConfig
 
-__all__ = ["Chat", "ChatMessage", "RichChatMessage", "GameID", "Message", "Bot"]
+__all__ = ["Chat", "ChatMessage", "ChatSummary", "RichChatMessage", "GameID", "Message", "Bot"]
 
 
 type GameID = int
 type Bot = str
 type Message = ChatMessage | RichChatMessage
+# cached rendering of a message: (message, rendered at, unchanged until, text, estimated tokens)
+type Rendering = Tuple[Message, DateTime, DateTime, str, int]
 
 
-class ChatMessage(BaseModel):
+class ChatMessage:
     """Basic chat message format for incoming messages."""
 
-    # base data
-    id: int
-    sender: str
-    message: str
-    time: DateTime
+    __slots__ = ("id", "sender", "message", "time")
+
+    def __init__(self, id: int, sender: str, message: str, time: DateTime) -> None:
+        # base data
+        self.id: int = id
+        self.sender: str = sys.intern(sender)
+        self.message: str = message
+        self.time: DateTime = time
 
     # helpers
     __str_template__: str = "[#{id}] ({time} ago) {sender}: {message}"
 
     def __str__(self) -> str:
-        return self.__str_template__.format(
-            id=self.id, sender=self.sender, message=self.message, time=self.format_time()
-        )
+        return self.render(DateTime.now())[0]
 
     def simple_str(self) -> str:
-        return self.__str__()
+        return self.render(DateTime.now(), simple=True)[0]
+
+    def render(self, now: DateTime, simple: bool = False) -> Tuple[str, DateTime]:
+        """Render the message with its age relative to `now`.
 
-    def format_time(self) -> str:
+        Returns:
+            Tuple[str, DateTime]: the rendered message and the time until which the shown age stays the same.
+        """
+        age: timedelta = now - self.time
+        time, unchanged_for = self._format_age(age.seconds)
+        unchanged_until: DateTime = self.time + timedelta(days=age.days, seconds=age.seconds + unchanged_for)
+        return self._format(time, simple), unchanged_until
+
+    def _format(self, time: str, simple: bool) -> str:
+        return self.__str_template__.format(id=self.id, sender=self.sender, message=self.message, time=time)
+
+    def format_time(self, now: DateTime | None = None) -> str:
         """Format the time difference of the message to now.
 
         Returns:
             str: the formatted string.
         """
-        seconds: int = (DateTime.now() - self.time).seconds
+        seconds: int = ((now or DateTime.now()) - self.time).seconds
+        return self._format_age(seconds)[0]
 
+    @staticmethod
+    def _format_age(seconds: int) -> Tuple[str, int]:
+        """The formatted age and the number of seconds after which the formatted value changes."""
         if seconds < 60:
-            return f"{seconds} sec"
+            return f"{seconds} sec", 1
         elif seconds // 3600 < 1:
-            return f"{seconds // 60} min"
+            return f"{seconds // 60} min", 60 - seconds % 60
         else:
-            return f"{seconds // 3600} hr"
+            return f"{seconds // 3600} hr", 3600 - seconds % 3600
 
 
 class RichChatMessage(ChatMessage):
     """Rich chat message format for enriched messages after analysis."""
 
-    # enriched data
-    receivers: List[str]
-    factual_information: str
-    self_revelation: str
-    relationship: str
-    appeal: str
+    __slots__ = ("receivers", "factual_information", "self_revelation", "relationship", "appeal")
+
+    def __init__(
+        self,
+        id: int,
+        sender: str,
+        message: str,
+        time: DateTime,
+        receivers: List[str],
+        factual_information: str,
+        self_revelation: str,
+        relationship: str,
+        appeal: str,
+    ) -> None:
+        super().__init__(id=id, sender=sender, message=message, time=time)
+        # enriched data
+        self.receivers: List[str] = [sys.intern(receiver) for receiver in receivers]
+        self.factual_information: str = factual_information
+        self.self_revelation: str = self_revelation
+        self.relationship: str = relationship
+        self.appeal: str = appeal
 
     # helpers
     __str_template__: str = """\
@@ -74,10 +117,17 @@ class RichChatMessage(ChatMessage):
     __base_str_template__: str = """\
 [#{id}] ({time} ago) {sender}: {message}"""
 
-    def __str__(self) -> str:
+    def _format(self, time: str, simple: bool) -> str:
+        if simple:
+            return self.__base_str_template__.format(
+                id=self.id,
+                time=time,
+                sender=self.sender,
+                message=self.message,
+            )
         return self.__str_template__.format(
             id=self.id,
-            time=self.format_time(),
+            time=time,
             sender=self.sender,
             message=self.message,
             receivers=self.receivers if self.receivers else "Unknown",
@@ -87,14 +137,6 @@ class RichChatMessage(ChatMessage):
             appeal=self.appeal,
         )
 
-    def simple_str(self) -> str:
-        return self.__base_str_template__.format(
-            id=self.id,
-            time=self.format_time(),
-            sender=self.sender,
-            message=self.message,
-        )
-
     @staticmethod
     def from_base(base: ChatMessage, analysis: FourSidesAnalysis) -> "RichChatMessage":
         return RichChatMessage(
@@ -110,15 +152,55 @@ class RichChatMessage(ChatMessage):
         )
 
 
-class Chat(BaseModel):
-    id: GameID
-    start_time: DateTime = Field(default_factory=DateTime.now)
-    last_message_time: DateTime = Field(default_factory=DateTime.now)
-    players: List[str]
-    bot: str
-    language: str
-    messages: Dict[int, Message] = Field(default_factory=dict)  # type: ignore
-    llmconfig: LLMConfig = Field(default_factory=LLMConfig)
+class ChatSummary:
+    """Rolling summary of the messages up to and including `last_message_id`."""
+
+    __slots__ = ("text", "last_message_id")
+
+    def __init__(self, text: str, last_message_id: int) -> None:
+        self.text: str = text
+        self.last_message_id: int = last_message_id
+
+
+class Chat:
+    __slots__ = (
+        "id",
+        "start_time",
+        "last_message_time",
+        "players",
+        "bot",
+        "language",
+        "messages",
+        "llmconfig",
+        "summary",
+        "_rendered",
+    )
+
+    def __init__(
+        self,
+        id: GameID,
+        players: List[str],
+        bot: str,
+        language: str,
+        start_time: DateTime | None = None,
+        last_message_time: DateTime | None = None,
+        messages: List[Message] | None = None,
+        llmconfig: LLMConfig | None = None,
+    ) -> None:
+        self.id: GameID = id
+        self.start_time: DateTime = start_time or DateTime.now()
+        self.last_message_time: DateTime = last_message_time or DateTime.now()
+        self.players: List[str] = [sys.intern(player) for player in players]
+        self.bot: str = sys.intern(bot)
+        self.language: str = language
+        # append-only message log, the message with id i is stored at index i
+        self.messages: List[Message] = messages if messages is not None else []
+        self.llmconfig: LLMConfig = llmconfig or LLMConfig()
+        self.summary: ChatSummary | None = None
+
+        # render cache parallel to `messages` per format (simple or not),
+        # entries are re-rendered once the message or its shown age changes
+        self._rendered: Dict[bool, List[Rendering | None]] = {False: [], True: []}
 
     __str_template__: str = """\
 # Chat History
@@ -131,37 +213,112 @@ Format:
 {messages}
 """
 
+    __collapsed_template__: str = "[#{first}-#{last}] {count} older messages omitted"
+    __summary_template__: str = "[#0-#{last}] Summary of older messages:\n{summary}"
+
+    # share of a history's token budget that may be spent on messages with their four-sides analysis
+    ANALYZED_BUDGET_SHARE: float = 0.6
+
     def add_message(self, message: Message) -> None:
-        self.messages[message.id] = message
-        self.last_message_time = message.time
+        """Append a new message or replace an existing one in place, e.g. after its analysis."""
+        if message.id == len(self.messages):
+            self.messages.append(message)
+        elif 0 <= message.id < len(self.messages):
+            self.messages[message.id] = message
+        else:
+            raise ValueError(f"Message ID {message.id} does not continue the chat of {len(self.messages)}")
+        # enriched messages are re-added with their original time, which must not move the clock back
+        self.last_message_time = max(self.last_message_time, message.time)
 
     def get_message(self, id: int) -> Message | None:
-        return self.messages.get(id)
+        return self.messages[id] if 0 <= id < len(self.messages) else None
 
     def get_last_n_messages(self, n: int) -> List[Message]:
+        """Get the messages with an ID of at least `last_message_id - n`, newest first."""
         min_id: int = max(0, self.last_message_id - n)
-        return [message for id, message in self.messages.items().__reversed__() if id >= min_id]
-
-    def get_formatted_chat_history(self, last_n: int | None = None, simple: bool = False) -> str:
+        return self.messages[: min_id - 1 : -1] if min_id > 0 else self.messages[::-1]
+
+    def get_formatted_chat_history(
+        self,
+        last_n: int | None = None,
+        simple: bool = False,
+        token_budget: int | None = None,
+        summarized: bool = False,
+    ) -> str:
         """Get the formatted chat history.
 
+        With a token budget, the history is windowed newest first: recent messages keep their four-sides
+        analysis within `ANALYZED_BUDGET_SHARE` of the budget, older ones are shown in their simple form and
+        the oldest are collapsed into a single line once even their simple form does not fit anymore.
+
         :param last_n: The number of last messages to include in the history.
+        :param simple: Whether to leave out the four-sides analysis of all messages.
+        :param token_budget: The estimated number of tokens the messages of the history may take.
+        :param summarized: Whether to replace the messages covered by the rolling summary with the summary.
         :return: a formatted string representation of the chat history.
         """
         if last_n is None:
             last_n = self.last_message_id
 
         last_n_messages: List[Message] = self.get_last_n_messages(last_n)
-
-        if simple:
-            messages: str = "\n".join([message.simple_str() for message in last_n_messages[::-1]])
-        else:
-            messages: str = "\n".join([str(message) for message in last_n_messages[::-1]])
+        first: int = last_n_messages[-1].id if last_n_messages else 0
+        summary: ChatSummary | None = self.summary if summarized else None
+        if summary is not None and first > summary.last_message_id:
+            summary = None  # the window starts after the summarized messages
+        if summary is not None:
+            first = summary.last_message_id + 1
+        remaining: float = float("inf") if token_budget is None else token_budget
+        analyzed_remaining: float = remaining * self.ANALYZED_BUDGET_SHARE
+
+        # one clock reading for the whole history, unchanged messages are served from the render cache
+        now: DateTime = DateTime.now()
+        cache: List[Rendering | None] = self._rendered[simple]
+        if len(cache) < len(self.messages):
+            cache.extend([None] * (len(self.messages) - len(cache)))
+        rendered: List[str] = []
+        for message in last_n_messages:
+            if message.id < first:
+                break
+            entry: Rendering | None = cache[message.id]
+            if entry is None or entry[0] is not message or not entry[1] <= now < entry[2]:
+                entry = self._render(message, now, simple)
+            if not simple:
+                analyzed_remaining -= entry[4]
+                if analyzed_remaining < 0:
+                    # every older message is shown in its simple form
+                    simple = True
+                    cache = self._rendered[simple]
+                    entry = self._render(message, now, simple)
+            if entry[4] > remaining:
+                collapsed: str = self.__collapsed_template__.format(
+                    first=first, last=message.id, count=message.id - first + 1
+                )
+                rendered.append(collapsed)
+                break
+            remaining -= entry[4]
+            rendered.append(entry[3])
+        if summary is not None:
+            rendered.append(
+                self.__summary_template__.format(last=summary.last_message_id, summary=summary.text)
+            )
+        rendered.reverse()
+
+        # the history is spliced in instead of formatted into the template, it is by far the longest part
+        header, footer = self.__str_template__.split("{messages}")
         start_time: str = self.start_time.strftime("%Y-%m-%d %H:%M:%S")
-        return self.__str_template__.format(
-            start_time=start_time,
-            messages=messages,
-        )
+        return "".join([header.format(start_time=start_time), "\n".join(rendered), footer])
+
+    def _render(self, message: Message, now: DateTime, simple: bool) -> Rendering:
+        cache: List[Rendering | None] = self._rendered[simple]
+        if len(cache) < len(self.messages):
+            cache.extend([None] * (len(self.messages) - len(cache)))
+        entry: Rendering | None = cache[message.id]
+        if entry is None or entry[0] is not message or not entry[1] <= now < entry[2]:
+            text, unchanged_until = message.render(now, simple)
+            # the line break joining the messages is counted as well
+            entry = (message, now, unchanged_until, text, estimate_tokens(text) + 1)
+            cache[message.id] = entry
+        return entry
 
     @property
     def participants(self) -> List[str]:
@@ -183,7 +340,7 @@ Format:
 
         :return: A list of human participants.
         """
-        humans: List[str] = list(set(self.players) - {self.bot})
+        humans: List[str] = [player for player in dict.fromkeys(self.players) if player != self.bot]
         return humans
 
     @property
@@ -200,7 +357,7 @@ Format:
 
         :return: The ID of the last message in the chat.
         """
-        return max(self.messages.keys(), default=0)
+        return max(0, len(self.messages) - 1)
 
     def __str__(self) -> str:
         """Get a string representation of the chat.
@@ -8,6 +8,10 @@ from fourmind.bot.services import prompts
 
 __all__ = [
     "FourSidesAnalysis",
+    "FourSidesMessageAnalysis",
+    "FourSidesBatchAnalysis",
+    "ParticipantSummary",
+    "ConversationSummary",
     "ChatSimulationMessage",
     "ChatSimulationReponse",
 ]
@@ -22,6 +26,27 @@ class FourSidesAnalysis(BaseModel):
     receivers: List[str] = Field(description=prompts.FourSidesAnalysisPrompts.receivers)
 
 
+class FourSidesMessageAnalysis(FourSidesAnalysis):
+    message_id: int = Field(description=prompts.FourSidesAnalysisPrompts.message_id)
+
+
+class FourSidesBatchAnalysis(BaseModel):
+    analyses: List[FourSidesMessageAnalysis] = Field(
+        description="""The analyses of all to-be-analyzed messages.
+        Each analysis refers to exactly one message by its ID."""
+    )
+
+
+class ParticipantSummary(BaseModel):
+    name: str = Field(description="The name of the participant.")
+    behavior: str = Field(description=prompts.SummaryPrompts.behavior)
+
+
+class ConversationSummary(BaseModel):
+    summary: str = Field(description=prompts.SummaryPrompts.summary)
+    participants: List[ParticipantSummary] = Field(description=prompts.SummaryPrompts.participants)
+
+
 class ChatSimulationMessage(BaseModel):
     sender: str = Field(description="The sender of the message.")
     message: str = Field(description="The message content.")
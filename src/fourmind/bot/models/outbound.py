@@ -0,0 +1,38 @@
+"""Runtime representation of a message of the bot waiting for its send deadline."""
+
+import asyncio
+from datetime import datetime as DateTime
+
+from fourmind.bot.models.branch import SimulatedBranch
+from fourmind.bot.models.timer import ScheduledTimer
+
+__all__ = ["OutboundMessage"]
+
+
+class OutboundMessage:
+    """A message of the bot queued until a human would have finished typing it."""
+
+    __slots__ = ("message", "kind", "after_id", "origin", "branch", "followup", "timer", "task")
+
+    def __init__(
+        self,
+        message: str,
+        kind: str,
+        after_id: int,
+        origin: DateTime,
+        branch: SimulatedBranch | None = None,
+        followup: str | None = None,
+    ) -> None:
+        self.message: str = message
+        self.kind: str = kind  # greeting, reply, followup or proactive
+        self.after_id: int = after_id  # id of the newest message of the chat when the message was queued
+        self.origin: DateTime = origin  # arrival of the message it answers, or when it was queued
+        self.branch: SimulatedBranch | None = branch  # continuation simulated with the message
+        self.followup: str | None = followup  # second half of a split message, queued once this one is sent
+        self.timer: ScheduledTimer | None = None  # send deadline, owned by the bot's DeadlineScheduler
+        self.task: asyncio.Task[None] | None = None  # delivery in progress
+
+    @property
+    def committed(self) -> bool:
+        """Whether the delivery has started, the message can no longer be withdrawn."""
+        return self.task is not None
@@ -0,0 +1,101 @@
+"""Pydantic records of chats at the persistence boundary.
+
+The bot works on the slotted runtime classes of `fourmind.bot.models.chat`; these records are only built
+when a chat is stored or loaded, e.g. for the experiments, and keep the stored JSON format unchanged.
+"""
+
+from datetime import datetime as DateTime
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+from fourmind.bot.models.chat import Chat, ChatMessage, GameID, Message, RichChatMessage
+from fourmind.bot.services.llm_inference import LLMConfig
+
+__all__ = ["ChatMessageRecord", "RichChatMessageRecord", "ChatRecord"]
+
+
+class ChatMessageRecord(BaseModel):
+    id: int
+    sender: str
+    message: str
+    time: DateTime
+
+    @staticmethod
+    def from_message(message: Message) -> "ChatMessageRecord":
+        if isinstance(message, RichChatMessage):
+            return RichChatMessageRecord(
+                id=message.id,
+                sender=message.sender,
+                message=message.message,
+                time=message.time,
+                receivers=message.receivers,
+                factual_information=message.factual_information,
+                self_revelation=message.self_revelation,
+                relationship=message.relationship,
+                appeal=message.appeal,
+            )
+        return ChatMessageRecord(
+            id=message.id, sender=message.sender, message=message.message, time=message.time
+        )
+
+    def to_message(self) -> Message:
+        return ChatMessage(id=self.id, sender=self.sender, message=self.message, time=self.time)
+
+
+class RichChatMessageRecord(ChatMessageRecord):
+    receivers: List[str]
+    factual_information: str
+    self_revelation: str
+    relationship: str
+    appeal: str
+
+    def to_message(self) -> Message:
+        return RichChatMessage(
+            id=self.id,
+            sender=self.sender,
+            message=self.message,
+            time=self.time,
+            receivers=self.receivers,
+            factual_information=self.factual_information,
+            self_revelation=self.self_revelation,
+            relationship=self.relationship,
+            appeal=self.appeal,
+        )
+
+
+class ChatRecord(BaseModel):
+    id: GameID
+    start_time: DateTime
+    last_message_time: DateTime
+    players: List[str]
+    bot: str
+    language: str
+    # stored as a dict keyed by message id
+    messages: Dict[int, RichChatMessageRecord | ChatMessageRecord] = Field(default_factory=dict)
+    llmconfig: LLMConfig = Field(default_factory=LLMConfig)
+
+    @staticmethod
+    def from_chat(chat: Chat) -> "ChatRecord":
+        return ChatRecord(
+            id=chat.id,
+            start_time=chat.start_time,
+            last_message_time=chat.last_message_time,
+            players=chat.players,
+            bot=chat.bot,
+            language=chat.language,
+            messages={message.id: ChatMessageRecord.from_message(message) for message in chat.messages},
+            llmconfig=chat.llmconfig,
+        )
+
+    def to_chat(self) -> Chat:
+        return Chat(
+            id=self.id,
+            players=self.players,
+            bot=self.bot,
+            language=self.language,
+            start_time=self.start_time,
+            last_message_time=self.last_message_time,
+            messages=[self.messages[key].to_message() for key in sorted(self.messages)],
+            llmconfig=self.llmconfig,
+        )
@@ -0,0 +1,119 @@
+"""Runtime state of a single game."""
+
+import asyncio
+from collections import deque
+from typing import Deque, List
+
+from fourmind.bot.models.branch import SimulatedBranch
+from fourmind.bot.models.chat import Chat, GameID
+from fourmind.bot.models.outbound import OutboundMessage
+from fourmind.bot.models.timer import ScheduledTimer
+
+__all__ = ["GameSession"]
+
+
+class GameSession:
+    """Owns the chat and all runtime state of one game.
+
+    Message handlers perform a single registry lookup and then work on the session only.
+    Tearing a game down is one `close()` call plus removing the session from the registry,
+    after which no per-game state is referenced by the bot anymore.
+    """
+
+    __slots__ = (
+        "chat",
+        "active",
+        "message_lock",
+        "analysis_backlog",
+        "analysis_scheduled",
+        "analysis_task",
+        "summary_task",
+        "generating",
+        "generation_task",
+        "followup_message",
+        "branch",
+        "outbound",
+        "proactive_task",
+        "prewarm_task",
+        "idle_timer",
+        "prewarm_timer",
+        "greeting_timer",
+        "timeout_timer",
+    )
+
+    def __init__(self, chat: Chat) -> None:
+        self.chat: Chat = chat
+        self.active: bool = True
+
+        # serializes message id assignment and analysis enqueueing within the game
+        self.message_lock: asyncio.Lock = asyncio.Lock()
+
+        # four sides analysis, processed by the shared worker pool of FourSidesQueue
+        # ids of messages waiting for analysis, grouped by the messages analyzed as one
+        self.analysis_backlog: Deque[List[int]] = deque()
+        self.analysis_scheduled: bool = False  # in the pool's ready queue or being processed
+        self.analysis_task: asyncio.Task[None] | None = None  # batch in flight
+        self.summary_task: asyncio.Task[None] | None = None  # rolling summary update in flight
+
+        # response generation
+        self.generating: bool = False  # a proactive message is being generated
+        self.generation_task: asyncio.Task[SimulatedBranch | None] | None = None  # freshest generation
+        self.followup_message: str | None = None  # temp buffer for cutted messages
+        self.branch: SimulatedBranch | None = None  # predicted continuation after the last reply
+        # messages waiting for their send deadline, see OutboundScheduler
+        self.outbound: Deque[OutboundMessage] = deque()
+
+        # proactive behaviour, timers are owned by the bot's DeadlineScheduler
+        self.proactive_task: asyncio.Task[None] | None = None
+        self.prewarm_task: asyncio.Task[str | None] | None = None  # proactive message generated ahead of time
+        self.idle_timer: ScheduledTimer | None = None
+        self.prewarm_timer: ScheduledTimer | None = None
+        self.greeting_timer: ScheduledTimer | None = None
+        self.timeout_timer: ScheduledTimer | None = None
+
+    @property
+    def id(self) -> GameID:
+        return self.chat.id
+
+    def close(self) -> None:
+        """Stop all background work of the game.
+
+        Safe to call from one of the game's own tasks, which is left running to finish the teardown.
+        """
+        self.active = False
+        current: asyncio.Task[object] | None = asyncio.current_task()
+        for task in (
+            self.analysis_task,
+            self.summary_task,
+            self.proactive_task,
+            self.prewarm_task,
+            self.generation_task,
+        ):
+            if task is not None and task is not current and not task.done():
+                task.cancel()
+        for timer in (self.idle_timer, self.prewarm_timer, self.greeting_timer, self.timeout_timer):
+            if timer is not None:
+                timer.cancel()
+        self.analysis_task = None
+        self.summary_task = None
+        self.proactive_task = None
+        self.prewarm_task = None
+        self.generation_task = None
+        self.idle_timer = None
+        self.prewarm_timer = None
+        self.greeting_timer = None
+        self.timeout_timer = None
+        self.followup_message = None
+        if self.branch is not None:
+            self.branch.discard()
+            self.branch = None
+        self.analysis_backlog.clear()
+        for outbound in self.outbound:
+            if outbound.timer is not None:
+                outbound.timer.cancel()
+            if outbound.task is not None and outbound.task is not current and not outbound.task.done():
+                outbound.task.cancel()
+        self.outbound.clear()
+
+    def __str__(self) -> str:
+        return str(self.chat)
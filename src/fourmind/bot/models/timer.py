@@ -0,0 +1,40 @@
+"""Runtime representation of a callback scheduled by the bot's DeadlineScheduler."""
+
+from typing import Callable
+
+__all__ = ["ScheduledTimer"]
+
+
+class ScheduledTimer:
+    """Handle of a scheduled callback, cancelling it is O(1)."""
+
+    __slots__ = ("when", "seq", "callback", "cancelled", "_on_cancel")
+
+    def __init__(
+        self, when: float, seq: int, callback: Callable[[], None], on_cancel: Callable[[], None]
+    ) -> None:
+        self.when: float = when
+        self.seq: int = seq
+        self.callback: Callable[[], None] | None = callback
+        self.cancelled: bool = False
+        self._on_cancel: Callable[[], None] | None = on_cancel  # bookkeeping of the scheduler
+
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.callback = None  # release references to the game right away
+        if self._on_cancel is not None:
+            self._on_cancel()
+            self._on_cancel = None
+
+    def _consume(self) -> Callable[[], None] | None:
+        """Mark the timer as fired and hand out its callback."""
+        callback: Callable[[], None] | None = self.callback
+        self.cancelled = True
+        self.callback = None
+        self._on_cancel = None
+        return callback
+
+    def __lt__(self, other: "ScheduledTimer") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
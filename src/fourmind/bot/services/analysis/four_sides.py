@@ -1,98 +1,263 @@
 """Submodule that implements the Four Sides Analysis message queue."""
 
 import asyncio
+from datetime import datetime as DateTime
+from enum import Enum
 from logging import Logger
-from typing import Dict
+from typing import Deque, Dict, List
 
 from openai import AsyncOpenAI
 
 from fourmind.bot.common.logger_factory import LoggerFactory
-from fourmind.bot.models.chat import Chat, GameID, Message, RichChatMessage
-from fourmind.bot.models.inference import FourSidesAnalysis
-from fourmind.bot.models.storage import ChatStorage
-from fourmind.bot.services import prompts
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.chat import Chat, ChatMessage, Message, RichChatMessage
+from fourmind.bot.models.inference import FourSidesAnalysis, FourSidesBatchAnalysis, FourSidesMessageAnalysis
+from fourmind.bot.models.session import GameSession
+from fourmind.bot.services.llm_gateway import LLMGateway, Priority
 from fourmind.bot.services.llm_inference import LLMInference
+from fourmind.bot.services.prompt_assembly import FOUR_SIDES, FOUR_SIDES_BATCH
+from fourmind.bot.services.response_cache import ResponseCache
 
 __all__ = [
     "FourSidesQueue",
+    "BacklogPolicy",
 ]
 
 
+class BacklogPolicy(Enum):
+    """What happens to the oldest messages of a game whose analysis backlog exceeds `MAX_BACKLOG`."""
+
+    # merge the oldest adjacent pending messages of one sender, they are analyzed as a single message and
+    # share its analysis, the oldest message is dropped if no messages can be merged
+    COALESCE = "coalesce"
+    DROP = "drop"  # leave the oldest messages un-enriched
+
+
 class FourSidesQueue(LLMInference):
+    """Four-sides analysis of all games by a shared pool of workers.
+
+    Games with pending messages wait in a FIFO ready queue, each game at most once. A worker takes one batch
+    of a game and re-queues the game at the end if it still has pending messages, so games are served
+    round-robin and a game with a burst of messages cannot starve the others. Analysis concurrency is bounded
+    by the number of workers, and the backlog of every game by `MAX_BACKLOG` and the `BACKLOG_POLICY`.
+    Backlog entries are groups of messages analyzed together as one message, at most `MAX_BATCH_SIZE` each.
+    """
+
     logger: Logger = LoggerFactory.setup_logger(__name__)
 
-    def __init__(self, storage: ChatStorage, client: AsyncOpenAI) -> None:
-        self.__storage: ChatStorage = storage
-        self.client: AsyncOpenAI = client
+    NUM_WORKERS: int = 8
+    # messages pending at once are analyzed in a single call, at most this many
+    MAX_BATCH_SIZE: int = 8
+    MAX_BACKLOG: int = 16
+    BACKLOG_POLICY: BacklogPolicy = BacklogPolicy.COALESCE
+    # estimated tokens of the chat history preceding the analyzed messages
+    HISTORY_TOKEN_BUDGET: int | None = 2000
 
-        self.queues: Dict[GameID, asyncio.Queue[int]] = dict()
-        self.tasks: Dict[GameID, asyncio.Task[None]] = dict()
-        self.running_flags: Dict[GameID, bool] = dict()
+    def __init__(
+        self, client: AsyncOpenAI, gateway: LLMGateway | None = None, cache: ResponseCache | None = None
+    ) -> None:
+        super().__init__(gateway, cache)
+        self.client: AsyncOpenAI = client
+        self.ready: asyncio.Queue[GameSession] = asyncio.Queue()
+        self.workers: List[asyncio.Task[None]] = []
+        self.in_flight: int = 0  # batches currently analyzed, each one is the `analysis_task` of its session
 
-    def add_queue(self, id: GameID) -> None:
-        self.queues[id] = asyncio.Queue()
-        self.running_flags[id] = True
-        task: asyncio.Task[None] = asyncio.create_task(self.process_queue(id=id))
-        self.tasks[id] = task
+    async def enqueue_item_async(self, session: GameSession, item: int) -> None:
+        backlog: Deque[List[int]] = session.analysis_backlog
+        backlog.append([item])
+        if len(backlog) > self.MAX_BACKLOG:
+            if self.BACKLOG_POLICY is BacklogPolicy.COALESCE and self.coalesce(session):
+                Metrics.increment("analysis.coalesced")
+            else:
+                dropped: List[int] = backlog.popleft()
+                self.logger.debug(f"{str(session)} Backlog full, dropping analysis of items {dropped}")
+                Metrics.increment("analysis.dropped", len(dropped))
+        self.logger.debug(f"{str(session)} Enqueued item {item} | backlog size: {len(backlog)}")
 
-    async def enqueue_item_async(self, id: GameID, item: int) -> None:
-        await self.queues[id].put(item)
-        self.logger.debug(
-            f"{str(self.__storage.chats[id])} Enqueued item {item} | queue size: {self.queues[id].qsize()}"
-        )
+        if not session.analysis_scheduled:
+            session.analysis_scheduled = True
+            self.ready.put_nowait(session)
+        if not self.workers:
+            self.workers = [asyncio.create_task(self.worker()) for _ in range(self.NUM_WORKERS)]
 
-    async def dequeue_and_cancel_async(self, id: GameID) -> None:
-        self.running_flags[id] = False
-        await self.queues[id].join()
-        if not self.tasks[id].cancelled():
-            self.tasks[id].cancel()
+    def coalesce(self, session: GameSession) -> bool:
+        """Merge the oldest two adjacent groups of the backlog that were sent by the same participant.
 
-        try:
-            _ = self.queues.pop(id)
-            _ = self.tasks.pop(id)
-        except KeyError:
-            self.logger.warning(f"Queue or Task for id {id} not found on delete attempt.")
+        Returns:
+            bool: whether two groups were merged.
+        """
+        backlog: Deque[List[int]] = session.analysis_backlog
+        senders: List[str | None] = []
+        for group in backlog:
+            message: Message | None = session.chat.get_message(group[0])
+            senders.append(message.sender if message is not None else None)
+        for i in range(len(backlog) - 1):
+            if (
+                senders[i] is not None
+                and senders[i] == senders[i + 1]
+                and len(backlog[i]) + len(backlog[i + 1]) <= self.MAX_BATCH_SIZE
+            ):
+                backlog[i].extend(backlog[i + 1])
+                del backlog[i + 1]
+                return True
+        return False
 
-    async def process_queue(self, id: GameID) -> None:
-        """An async method deployed as a separate task for each queue.
+    async def drain_async(self, session: GameSession, timeout: float) -> None:
+        """Stop the analysis of an ended game within `timeout` seconds.
 
-        The method processes the queue of messages for a chat with the given ID.
+        Pending messages are abandoned, the batch in flight may finish until the deadline so that its analyses
+        are persisted, afterwards its LLM call is cancelled. The session must already be inactive so that the
+        workers do not pick it up again.
         """
-        chat_ref: Chat = self.__storage.chats[id]
-        self.logger.info(f"{str(chat_ref)} Queue up and running.")
+        if session.analysis_backlog:
+            Metrics.increment("analysis.abandoned", sum(len(group) for group in session.analysis_backlog))
+            session.analysis_backlog.clear()
+        task: asyncio.Task[None] | None = session.analysis_task
+        if task is None or task.done():
+            return None
 
-        while self.running_flags[id]:
-            # get
-            message_id: int = await self.queues[id].get()
-            self.logger.debug(f"Processing message with ID {message_id}")
+        _, pending = await asyncio.wait({task}, timeout=timeout)
+        if pending:
+            self.logger.warning(f"{str(session)} Analysis still running at teardown deadline, cancelling")
+            Metrics.increment("analysis.teardown_cancelled")
+            task.cancel()
+            await asyncio.wait({task})  # the cancellation must not enrich the chat after it is persisted
 
-            message: Message | None = chat_ref.get_message(message_id)
-            if message is None:
-                self.logger.error(f"Message with ID {message_id} not found in chat {str(chat_ref)}")
-                continue
-            elif isinstance(message, RichChatMessage):
-                self.logger.info(f"Skipping RichChatMessage with ID {message_id}")
+    async def worker(self) -> None:
+        """Worker of the pool, processes one batch of the next ready game at a time."""
+        while True:
+            session: GameSession = await self.ready.get()
+            Metrics.observe("analysis.ready_games", self.ready.qsize())
+            if not session.active or not session.analysis_backlog:
+                session.analysis_scheduled = False
                 continue
 
-            analysis: FourSidesAnalysis | None = await self.ainfer(
-                client=self.client,
-                config=chat_ref.llmconfig,
-                system_prompt=prompts.FourSidesAnalysisPrompts.system.format(
-                    ai_user=chat_ref.bot,
-                    game_description=prompts,
+            groups: List[List[int]] = self.take_batch(session)
+            task: asyncio.Task[None] = asyncio.create_task(self.process_batch(session, groups))
+            session.analysis_task = task
+            self.in_flight += 1
+            Metrics.observe("analysis.in_flight", self.in_flight)
+            try:
+                await task
+            except asyncio.CancelledError:
+                current: asyncio.Task[object] | None = asyncio.current_task()
+                if current is not None and current.cancelling() > 0:
+                    raise  # the worker itself is cancelled
+            except Exception as e:
+                self.logger.exception(f"{str(session)} Analysis failed: {e}")
+            finally:
+                self.in_flight -= 1
+                if session.analysis_task is task:
+                    session.analysis_task = None
+
+            if session.active and session.analysis_backlog:
+                self.ready.put_nowait(session)
+            else:
+                session.analysis_scheduled = False
+
+    def take_batch(self, session: GameSession) -> List[List[int]]:
+        backlog: Deque[List[int]] = session.analysis_backlog
+        return [backlog.popleft() for _ in range(min(self.MAX_BATCH_SIZE, len(backlog)))]
+
+    async def process_batch(self, session: GameSession, groups: List[List[int]]) -> None:
+        """Analyze the given message groups of the session together in one call."""
+        chat_ref: Chat = session.chat
+        self.logger.debug(f"Processing messages with IDs {groups}")
+
+        units: List[List[Message]] = []
+        for group in groups:
+            unit: List[Message] = []
+            for message_id in group:
+                message: Message | None = chat_ref.get_message(message_id)
+                if message is None:
+                    self.logger.error(f"Message with ID {message_id} not found in chat {str(chat_ref)}")
+                    continue
+                elif isinstance(message, RichChatMessage):
+                    self.logger.info(f"Skipping RichChatMessage with ID {message_id}")
+                    continue
+                Metrics.observe("analysis.queue_lag", (DateTime.now() - message.time).total_seconds())
+                unit.append(message)
+            if unit:
+                units.append(unit)
+        if not units:
+            return None
+        Metrics.observe("analysis.batch_size", len(units))
+
+        if len(units) == 1:
+            await self.analyze_message_async(chat_ref, units[0])
+        else:
+            await self.analyze_batch_async(chat_ref, units)
+
+    @staticmethod
+    def merged(unit: List[Message]) -> Message:
+        """A group of coalesced messages of one sender as a single message with the id of the newest one."""
+        if len(unit) == 1:
+            return unit[0]
+        newest: Message = unit[-1]
+        return ChatMessage(
+            id=newest.id,
+            sender=newest.sender,
+            message=" / ".join(message.message for message in unit),
+            time=newest.time,
+        )
+
+    async def analyze_message_async(self, chat_ref: Chat, unit: List[Message]) -> None:
+        analysis: FourSidesAnalysis | None = await self.ainfer(
+            client=self.client,
+            config=chat_ref.llmconfig,
+            system_prompt=FOUR_SIDES.system,
+            instruction_prompt=FOUR_SIDES.instruction(
+                ai_user=chat_ref.bot,
+                participants=", ".join(chat_ref.participants),
+                chat_history=chat_ref.get_formatted_chat_history(
+                    last_n=unit[0].id, token_budget=self.HISTORY_TOKEN_BUDGET, summarized=True
                 ),
-                instruction_prompt=prompts.FourSidesAnalysisPrompts.instruction.format(
-                    participants=", ".join(chat_ref.participants),
-                    chat_history=chat_ref.get_formatted_chat_history(last_n=message.id),
-                    message=str(message),
+                message=str(self.merged(unit)),
+            ),
+            response_model=FourSidesAnalysis,
+            priority=Priority.ANALYSIS,
+            game_id=chat_ref.id,
+            stage=FOUR_SIDES.stage,
+        )
+        if analysis is None:
+            self.logger.error(f"Failed to analyze message with ID {unit[-1].id}")
+            return None
+        for message in unit:
+            self.enrich(chat_ref, message, analysis)
+
+    async def analyze_batch_async(self, chat_ref: Chat, units: List[List[Message]]) -> None:
+        response: FourSidesBatchAnalysis | None = await self.ainfer(
+            client=self.client,
+            config=chat_ref.llmconfig,
+            system_prompt=FOUR_SIDES_BATCH.system,
+            instruction_prompt=FOUR_SIDES_BATCH.instruction(
+                ai_user=chat_ref.bot,
+                participants=", ".join(chat_ref.participants),
+                chat_history=chat_ref.get_formatted_chat_history(
+                    last_n=units[0][0].id, token_budget=self.HISTORY_TOKEN_BUDGET, summarized=True
                 ),
-                response_model=FourSidesAnalysis,
-            )
+                messages="\n".join(str(self.merged(unit)) for unit in units),
+            ),
+            response_model=FourSidesBatchAnalysis,
+            priority=Priority.ANALYSIS,
+            game_id=chat_ref.id,
+            stage=FOUR_SIDES_BATCH.stage,
+        )
+        if response is None:
+            self.logger.error(f"Failed to analyze messages with IDs {[unit[-1].id for unit in units]}")
+            return None
+
+        analyses: Dict[int, FourSidesMessageAnalysis] = {a.message_id: a for a in response.analyses}
+        for unit in units:
+            analysis: FourSidesMessageAnalysis | None = analyses.get(unit[-1].id)
             if analysis is None:
-                self.logger.error(f"Failed to analyze message with ID {message_id}")
+                self.logger.error(f"Batch analysis is missing message with ID {unit[-1].id}")
+                Metrics.increment("analysis.batch_missing")
                 continue
+            for message in unit:
+                self.enrich(chat_ref, message, analysis)
 
-            rich_chat_message: RichChatMessage = RichChatMessage.from_base(message, analysis)
-            chat_ref.add_message(rich_chat_message)
-
-        self.logger.info(f"Queue for chat {str(chat_ref)} has been stopped.")
+    def enrich(self, chat_ref: Chat, message: Message, analysis: FourSidesAnalysis) -> None:
+        rich_chat_message: RichChatMessage = RichChatMessage.from_base(message, analysis)
+        chat_ref.add_message(rich_chat_message)
+        Metrics.observe("analysis.enrichment_lag", (DateTime.now() - message.time).total_seconds())
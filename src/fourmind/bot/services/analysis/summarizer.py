@@ -0,0 +1,88 @@
+"""Submodule implementing the rolling summary of each game's chat."""
+
+import asyncio
+from datetime import datetime as DateTime
+from logging import Logger
+from typing import List
+
+from openai import AsyncOpenAI
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.chat import Chat, ChatSummary, Message
+from fourmind.bot.models.inference import ConversationSummary
+from fourmind.bot.models.session import GameSession
+from fourmind.bot.services.llm_gateway import LLMGateway, Priority
+from fourmind.bot.services.llm_inference import LLMInference
+from fourmind.bot.services.prompt_assembly import SUMMARY
+from fourmind.bot.services.response_cache import ResponseCache
+
+__all__ = ["ConversationSummarizer"]
+
+
+class ConversationSummarizer(LLMInference):
+    """Keeps a compact summary of the older messages of every game.
+
+    Once `REFRESH_INTERVAL` messages have accumulated behind the summary, outside of the `RECENT_TAIL` newest
+    messages, the summary is updated in the background from the previous summary and only those new
+    messages. The four-sides analysis and the lookahead then send the summary plus the recent tail instead of
+    the whole transcript, so the prompt of each call stays bounded however long the game runs.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    ENABLED: bool = True
+    REFRESH_INTERVAL: int = 8
+    # newest messages that are always sent verbatim and never summarized
+    RECENT_TAIL: int = 6
+
+    def __init__(
+        self, client: AsyncOpenAI, gateway: LLMGateway | None = None, cache: ResponseCache | None = None
+    ) -> None:
+        super().__init__(gateway, cache)
+        self.client: AsyncOpenAI = client
+
+    def refresh_if_due(self, session: GameSession) -> None:
+        """Start a background update of the session's summary if enough messages have accumulated."""
+        if not self.ENABLED or not session.active:
+            return None
+        if session.summary_task is not None and not session.summary_task.done():
+            return None
+        chat: Chat = session.chat
+        covered: int = chat.summary.last_message_id if chat.summary is not None else -1
+        until: int = chat.last_message_id - self.RECENT_TAIL
+        if until - covered < self.REFRESH_INTERVAL:
+            return None
+        session.summary_task = asyncio.create_task(self.summarize_async(chat, until))
+
+    async def summarize_async(self, chat: Chat, until: int) -> None:
+        """Fold the messages after the current summary up to and including `until` into the summary."""
+        previous: ChatSummary | None = chat.summary
+        first: int = previous.last_message_id + 1 if previous is not None else 0
+        messages: List[Message] = chat.messages[first : until + 1]
+        now: DateTime = DateTime.now()
+
+        response: ConversationSummary | None = await self.ainfer(
+            client=self.client,
+            config=chat.llmconfig,
+            system_prompt=SUMMARY.system,
+            instruction_prompt=SUMMARY.instruction(
+                ai_user=chat.bot,
+                participants=", ".join(chat.participants),
+                summary=previous.text if previous is not None else "No messages have been summarized yet.",
+                messages="\n".join(message.render(now)[0] for message in messages),
+            ),
+            response_model=ConversationSummary,
+            priority=Priority.ANALYSIS,
+            game_id=chat.id,
+            stage=SUMMARY.stage,
+        )
+        if response is None:
+            self.logger.error(f"{str(chat)} Failed to summarize messages {first} to {until}")
+            return None
+
+        lines: List[str] = [response.summary]
+        lines.extend(f"- {participant.name}: {participant.behavior}" for participant in response.participants)
+        chat.summary = ChatSummary(text="\n".join(lines), last_message_id=until)
+        Metrics.increment("summary.refreshed")
+        Metrics.observe("summary.lag", chat.last_message_id - until)
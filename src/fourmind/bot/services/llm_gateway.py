@@ -0,0 +1,214 @@
+"""Submodule implementing the gateway that coordinates all LLM calls of the bot across games."""
+
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from logging import Logger
+from typing import AsyncIterator, Dict, List
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+
+__all__ = ["LLMGateway", "GatewayLimits", "GatewayPermit", "Priority"]
+
+
+class Priority(IntEnum):
+    """Priority classes of LLM calls, lower values are dispatched first."""
+
+    RESPONSE = 0  # replies on the critical path of a game
+    PROACTIVE = 1
+    ANALYSIS = 2  # four-sides enrichment in the background
+
+
+@dataclass
+class GatewayLimits:
+    """Limits applied to the calls of one model."""
+
+    max_concurrency: int = 32
+    requests_per_minute: float = 5_000
+    tokens_per_minute: float = 4_000_000
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, per_minute: float, now: float) -> None:
+        self.capacity: float = per_minute
+        self.rate: float = per_minute / 60.0
+        self.tokens: float = per_minute
+        self.updated: float = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available, amounts above the capacity only need a full bucket."""
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+
+class GatewayPermit:
+    """Admission of a single LLM call, report the actual token usage once the completion is known."""
+
+    __slots__ = ("model", "estimated_tokens", "used_tokens")
+
+    def __init__(self, model: str, estimated_tokens: int) -> None:
+        self.model: str = model
+        self.estimated_tokens: int = estimated_tokens
+        self.used_tokens: int | None = None
+
+
+class _Waiter:
+    __slots__ = ("priority", "tag", "seq", "future", "permit", "enqueued")
+
+    def __init__(
+        self, priority: Priority, tag: float, seq: int, future: asyncio.Future[None], permit: GatewayPermit
+    ) -> None:
+        self.priority: Priority = priority
+        self.tag: float = tag
+        self.seq: int = seq
+        self.future: asyncio.Future[None] = future
+        self.permit: GatewayPermit = permit
+        self.enqueued: float = future.get_loop().time()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.tag, self.seq) < (other.priority, other.tag, other.seq)
+
+
+class _ModelState:
+    __slots__ = (
+        "limits",
+        "in_flight",
+        "waiting",
+        "requests",
+        "tokens",
+        "virtual_time",
+        "finish_tags",
+        "paused_until",
+        "wakeup",
+    )
+
+    def __init__(self, limits: GatewayLimits, now: float) -> None:
+        self.limits: GatewayLimits = limits
+        self.in_flight: int = 0
+        self.waiting: List[_Waiter] = []
+        self.requests: TokenBucket = TokenBucket(limits.requests_per_minute, now)
+        self.tokens: TokenBucket = TokenBucket(limits.tokens_per_minute, now)
+        # start-time fair queuing: each game's calls are tagged after its previous call
+        self.virtual_time: float = 0.0
+        self.finish_tags: Dict[int, float] = {}
+        self.paused_until: float = 0.0
+        self.wakeup: asyncio.TimerHandle | None = None
+
+
+class LLMGateway:
+    """Admission control shared by all LLM calls of the bot.
+
+    Per model, the gateway bounds the number of concurrent calls and keeps the request and token rates below
+    the provider's per-minute limits with token buckets. Waiting calls are dispatched by priority class first
+    and fairly across games within a class, so a game with a burst of analysis calls cannot delay the
+    others. Rate limit responses of the provider pause dispatching for the model.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    def __init__(
+        self, limits: GatewayLimits | None = None, model_limits: Dict[str, GatewayLimits] | None = None
+    ) -> None:
+        self.limits: GatewayLimits = limits or GatewayLimits()
+        self.model_limits: Dict[str, GatewayLimits] = model_limits or {}
+        self._models: Dict[str, _ModelState] = {}
+        self._counter = itertools.count()
+
+    @asynccontextmanager
+    async def acquire(
+        self, model: str, priority: Priority, game_id: int | None, estimated_tokens: int
+    ) -> AsyncIterator[GatewayPermit]:
+        """Wait until the call may be sent, the permit is released when the context exits."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        state: _ModelState = self._state(model, loop)
+        permit = GatewayPermit(model, estimated_tokens)
+
+        key: int = -1 if game_id is None else game_id
+        tag: float = max(state.virtual_time, state.finish_tags.get(key, 0.0))
+        state.finish_tags[key] = tag + 1.0
+        waiter = _Waiter(priority, tag, next(self._counter), loop.create_future(), permit)
+        heapq.heappush(state.waiting, waiter)
+        self._dispatch(state, loop)
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(state, loop)  # admitted right before the cancellation arrived
+            raise
+        wait: float = loop.time() - waiter.enqueued
+        Metrics.observe("gateway.queue_wait", wait)
+        Metrics.observe(f"gateway.queue_wait.{priority.name.lower()}", wait)
+
+        try:
+            yield permit
+        finally:
+            if permit.used_tokens is not None:
+                # settle the estimate that was withdrawn up front against the actual usage
+                reserved: float = min(permit.estimated_tokens, state.tokens.capacity)
+                state.tokens.tokens -= permit.used_tokens - reserved
+            self._release(state, loop)
+
+    def throttle(self, model: str, retry_after: float) -> None:
+        """Pause dispatching for `model` after the provider answered with a rate limit error."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        state: _ModelState = self._state(model, loop)
+        state.paused_until = max(state.paused_until, loop.time() + retry_after)
+        state.tokens.tokens = min(state.tokens.tokens, 0.0)
+        Metrics.increment("gateway.throttled")
+        self.logger.warning(f"Rate limited on {model}, pausing for {retry_after:.1f}s")
+
+    def _state(self, model: str, loop: asyncio.AbstractEventLoop) -> _ModelState:
+        state: _ModelState | None = self._models.get(model)
+        if state is None:
+            state = _ModelState(self.model_limits.get(model, self.limits), loop.time())
+            self._models[model] = state
+        return state
+
+    def _release(self, state: _ModelState, loop: asyncio.AbstractEventLoop) -> None:
+        state.in_flight -= 1
+        self._dispatch(state, loop)
+
+    def _dispatch(self, state: _ModelState, loop: asyncio.AbstractEventLoop) -> None:
+        """Admit waiting calls in order as long as the concurrency limit and the rate limits allow."""
+        if state.wakeup is not None:
+            state.wakeup.cancel()
+            state.wakeup = None
+
+        now: float = loop.time()
+        state.requests.refill(now)
+        state.tokens.refill(now)
+        while state.waiting and state.in_flight < state.limits.max_concurrency:
+            waiter: _Waiter = state.waiting[0]
+            if waiter.future.done():  # cancelled while waiting
+                heapq.heappop(state.waiting)
+                continue
+            delay: float = max(
+                state.paused_until - now,
+                state.requests.wait_time(1),
+                state.tokens.wait_time(waiter.permit.estimated_tokens),
+            )
+            if delay > 0:
+                state.wakeup = loop.call_later(delay, self._dispatch, state, loop)
+                break
+            heapq.heappop(state.waiting)
+            state.requests.tokens -= 1
+            state.tokens.tokens -= min(waiter.permit.estimated_tokens, state.tokens.capacity)
+            state.virtual_time = max(state.virtual_time, waiter.tag)
+            state.in_flight += 1
+            waiter.future.set_result(None)
+
+        # forget games whose calls are all dispatched, their next call starts at the virtual time anyway
+        if len(state.finish_tags) > 2 * len(state.waiting) + 64:
+            state.finish_tags = {
+                game: tag for game, tag in state.finish_tags.items() if tag > state.virtual_time
+            }
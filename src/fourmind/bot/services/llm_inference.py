@@ -1,21 +1,49 @@
 """Submodule implementing the base inference method for calling LLMs using the OpenAI format."""
 
+import asyncio
+import json
+import math
 import random
+import time
+from collections import deque
+from contextlib import aclosing
 from logging import Logger
-from typing import Type, TypeVar
+from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    List,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    get_args,
+)
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
+from openai.types import CompletionUsage
 from openai.types.chat import ParsedChatCompletion, ParsedChatCompletionMessage
+from openai.types.completion_usage import PromptTokensDetails
 from pydantic import BaseModel, Field
 
 from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.common.tokens import estimate_tokens
+from fourmind.bot.services.llm_gateway import GatewayPermit, LLMGateway, Priority
+from fourmind.bot.services.response_cache import CacheMode, ResponseCache
 
 __all__ = [
     "LLMInference",
     "LLMConfig",
+    "StreamingArrayParser",
 ]
 
 TBaseModel = TypeVar("TBaseModel", bound=BaseModel)
+TItem = TypeVar("TItem", bound=BaseModel)
+TResult = TypeVar("TResult")
 
 
 class LLMConfig(BaseModel):
@@ -25,13 +53,86 @@ class LLMConfig(BaseModel):
     temperature: float = Field(default_factory=lambda _: random.uniform(0.4, 0.9))
 
 
+class StreamingArrayParser(Generic[TItem]):
+    """Incremental parser for structured output that is streamed as JSON text.
+
+    Yields the items of one array field of the top-level JSON object as soon as their closing bracket has
+    been received, long before the whole response is complete. Items must be JSON objects.
+    """
+
+    def __init__(self, field: str, item_model: Type[TItem]) -> None:
+        self.field: str = field
+        self.item_model: Type[TItem] = item_model
+
+        self._buffer: str = ""
+        self._depth: int = 0
+        self._in_string: bool = False
+        self._escape: bool = False
+        self._string_start: int = 0
+        self._last_key: str | None = None  # last string seen on the top level
+        self._in_array: bool = False
+        self._item_start: int | None = None
+
+    def feed(self, chunk: str) -> List[TItem]:
+        """Consume the next piece of the JSON text and return all items completed by it."""
+        start: int = len(self._buffer)
+        self._buffer += chunk
+        buffer: str = self._buffer
+        items: List[TItem] = []
+        for i in range(start, len(buffer)):
+            char: str = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = buffer[self._string_start + 1 : i]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._last_key == self.field:
+                    self._in_array = True
+                elif self._in_array and self._depth == 3:
+                    self._item_start = i
+            elif char in "}]":
+                if self._in_array and self._depth == 3 and self._item_start is not None:
+                    items.append(self.item_model.model_validate_json(buffer[self._item_start : i + 1]))
+                    self._item_start = None
+                elif self._in_array and self._depth == 2:
+                    self._in_array = False
+                self._depth -= 1
+        return items
+
+
 class LLMInference:
     """This class implements the base inference method for calling LLMs using the OpenAI format."""
 
     FALLBACK_CONFIG: LLMConfig = LLMConfig(base_model="gpt-4o-mini-2024-07-18", temperature=0.65)
+    # completion tokens reserved in the gateway's token bucket before the actual usage is known
+    COMPLETION_TOKENS_ESTIMATE: int = 256
+    # hedged calls send a second request on FALLBACK_CONFIG once they are slower than this percentile
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_SAMPLES: int = 20
+    LATENCY_WINDOW: int = 200
     logger: Logger = LoggerFactory.setup_logger(__name__)
 
-    def __init__(self) -> None: ...
+    gateway: LLMGateway
+    cache: ResponseCache
+    # JSON schemas of the response models, part of the cache keys
+    _schemas: Dict[Type[BaseModel], str] = {}
+    # recent latencies of successful raced calls by name, model and variant, shared by all instances
+    _latencies: Dict[Tuple[str, str, str], Deque[float]] = {}
+
+    def __init__(self, gateway: LLMGateway | None = None, cache: ResponseCache | None = None) -> None:
+        self.gateway = gateway or LLMGateway()
+        self.cache = cache or ResponseCache(CacheMode.OFF, path=None)
+        # streams read to the end for the response cache after their caller stopped, see `astream_items`
+        self._recordings: Set[asyncio.Task[None]] = set()
 
     async def ainfer(
         self,
@@ -40,30 +141,328 @@ class LLMInference:
         system_prompt: str,
         instruction_prompt: str,
         response_model: Type[TBaseModel],
+        priority: Priority = Priority.ANALYSIS,
+        game_id: int | None = None,
+        stage: str | None = None,
+        on_usage: Callable[[int], None] | None = None,
     ) -> TBaseModel | None:
-        try:
-            completion: ParsedChatCompletion[TBaseModel] = await client.beta.chat.completions.parse(
-                model=config.base_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt,
-                    },
-                    {
-                        "role": "user",
-                        "content": instruction_prompt,
-                    },
-                ],
-                temperature=config.temperature,
-                response_format=response_model,
-            )
-        except Exception as e:
-            self.logger.error(f"Failed to generate response: {e}")
-            return None
+        """Request a structured completion, see `arace` to bound it by a deadline.
+
+        Token usage is counted per `stage`, by default per response model. `on_usage` is called with the
+        completion tokens of the call, unless the response was served from the cache.
+        """
+        key: str | None = None
+        if self.cache.enabled:
+            key = self.cache_key(config, system_prompt, instruction_prompt, response_model)
+            cached: str | None = await self.cache.get(key)
+            if cached is not None:
+                return response_model.model_validate_json(cached)
+
+        async with self.gateway.acquire(
+            config.base_model, priority, game_id, self.estimate_tokens(system_prompt, instruction_prompt)
+        ) as permit:
+            start: float = time.perf_counter()
+            try:
+                completion: ParsedChatCompletion[TBaseModel] = await client.beta.chat.completions.parse(
+                    model=config.base_model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": system_prompt,
+                        },
+                        {
+                            "role": "user",
+                            "content": instruction_prompt,
+                        },
+                    ],
+                    temperature=config.temperature,
+                    response_format=response_model,
+                )
+            except Exception as e:
+                self.logger.error(f"Failed to generate response: {e}")
+                Metrics.increment(f"llm.{response_model.__name__}.errors")
+                self.on_error(e, permit)
+                return None
+            if completion.usage is not None:
+                permit.used_tokens = completion.usage.total_tokens
+        Metrics.observe(f"llm.{response_model.__name__}.latency", time.perf_counter() - start)
+        Metrics.increment(f"llm.{response_model.__name__}.calls")
+        if completion.usage is not None:
+            self.record_usage(stage or response_model.__name__, completion.usage)
+            if on_usage is not None:
+                on_usage(completion.usage.completion_tokens)
         response: ParsedChatCompletionMessage[TBaseModel] = completion.choices[0].message
         if not response.parsed:
             self.logger.warning(f"Failed to parse response: {response.refusal}")
             return None
 
         result: TBaseModel = response.parsed
+        if key is not None:
+            await self.cache.put(key, result.model_dump_json())
         return result
+
+    async def arace(
+        self,
+        name: str,
+        attempt: Callable[[LLMConfig], Awaitable[TResult | None]],
+        config: LLMConfig,
+        timeout: float | None = None,
+        hedge: bool = False,
+        variant: str = "",
+        discard: Callable[[TResult], None] | None = None,
+    ) -> TResult | None:
+        """Run `attempt` on `config` within the deadline, hedged by a second attempt on `FALLBACK_CONFIG`.
+
+        The hedge is sent once the first attempt has taken longer than the observed `HEDGE_PERCENTILE` latency
+        of `name` on the model of `config`, or right away if the first attempt failed. Latencies are kept per
+        `variant` as well, e.g. per simulation horizon. The first valid result wins and the other attempt is
+        cancelled together with its LLM call, a result arriving at the same time is passed to `discard`.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        start: float = loop.time()
+        deadline: float = start + timeout if timeout is not None else math.inf
+        window: Tuple[str, str, str] = (name, config.base_model, variant)
+        hedge_at: float = start + (self.hedge_delay(window) if hedge else math.inf)
+        hedge_task: asyncio.Task[TResult | None] | None = None
+        pending: Set[asyncio.Task[TResult | None]] = {asyncio.create_task(attempt(config))}
+        Metrics.increment(f"llm.{name}.raced")  # the hedge rate is hedged / raced
+        try:
+            while pending:
+                wake_at: float = deadline if hedge_task is not None else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if math.isinf(wake_at) else max(0.0, wake_at - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                winner: TResult | None = None
+                for task in done:
+                    error: BaseException | None = task.exception()
+                    if error is not None:
+                        self.logger.error(f"{name} attempt failed: {error!r}")
+                    result: TResult | None = task.result() if error is None else None
+                    if result is None:
+                        continue
+                    if winner is not None:
+                        # both attempts finished at once, the loser must not keep running in the background
+                        if discard is not None:
+                            discard(result)
+                        continue
+                    winner = result
+                    self._latencies.setdefault(window, deque(maxlen=self.LATENCY_WINDOW)).append(
+                        loop.time() - start
+                    )
+                    if task is hedge_task:
+                        Metrics.increment(f"llm.{name}.hedge_won")
+                if winner is not None:
+                    return winner
+
+                now: float = loop.time()
+                if now >= deadline:
+                    self.logger.warning(f"{name} exceeded its deadline of {timeout:.1f}s")
+                    Metrics.increment(f"llm.{name}.deadline_exceeded")
+                    return None
+                if hedge and hedge_task is None and (now >= hedge_at or not pending):
+                    hedge_task = asyncio.create_task(attempt(self.FALLBACK_CONFIG))
+                    pending.add(hedge_task)
+                    Metrics.increment(f"llm.{name}.hedged")
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def hedge_delay(self, window: Tuple[str, str, str]) -> float:
+        """The observed `HEDGE_PERCENTILE` latency of a (name, model, variant) `window`, infinite until enough
+        calls were observed."""
+        latencies: Deque[float] | None = self._latencies.get(window)
+        if latencies is None or len(latencies) < self.HEDGE_MIN_SAMPLES:
+            return math.inf
+        ordered: List[float] = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.HEDGE_PERCENTILE / 100))]
+
+    async def astream_items(
+        self,
+        client: AsyncOpenAI,
+        config: LLMConfig,
+        system_prompt: str,
+        instruction_prompt: str,
+        response_model: Type[TBaseModel],
+        field: str,
+        priority: Priority = Priority.ANALYSIS,
+        game_id: int | None = None,
+        stage: str | None = None,
+        on_usage: Callable[[int], None] | None = None,
+    ) -> AsyncGenerator[BaseModel, None]:
+        """Stream the completion and yield the items of the list field `field` of `response_model` one by one.
+
+        The caller may stop iterating after any item, closing the generator (e.g. with `contextlib.aclosing`)
+        aborts the completion so that no further output tokens are generated. `on_usage` is called with the
+        completion tokens of the final usage chunk, or with an estimate of the streamed output if the
+        completion was aborted before the usage was sent.
+
+        The provider reports the prompt tokens and the cached prompt tokens in the final usage chunk only, so
+        every stream of a `stage` counts its estimated prompt tokens when it starts, aborted streams are
+        counted as `llm.{stage}.aborted` and the cache hit rate of the stage covers completed streams only.
+
+        While the response cache stores responses, the completion is not aborted: it is streamed to the end by
+        a background task and cached as a whole, so that later calls with the same prompts are served from the
+        cache however many items their caller consumes.
+        """
+        key: str | None = None
+        if self.cache.enabled:
+            key = self.cache_key(config, system_prompt, instruction_prompt, response_model)
+            cached: str | None = await self.cache.get(key)
+            if cached is not None:
+                for item in getattr(response_model.model_validate_json(cached), field):
+                    yield item
+                return
+
+        items: AsyncGenerator[BaseModel, None] = self._astream_items(
+            client,
+            config,
+            system_prompt,
+            instruction_prompt,
+            response_model,
+            field,
+            priority,
+            game_id,
+            stage,
+            on_usage,
+            key,
+        )
+        if key is None:
+            async with aclosing(items):
+                async for item in items:
+                    yield item
+            return
+
+        queue: asyncio.Queue[BaseModel | None] = asyncio.Queue()
+        recording: asyncio.Task[None] = asyncio.create_task(self._arecord_items(items, queue))
+        self._recordings.add(recording)
+        recording.add_done_callback(self._recordings.discard)
+        while (item := await queue.get()) is not None:
+            yield item
+
+    @staticmethod
+    async def _arecord_items(
+        items: AsyncGenerator[BaseModel, None], queue: asyncio.Queue[BaseModel | None]
+    ) -> None:
+        """Stream all items into `queue` whether or not they are consumed, None marks the end."""
+        try:
+            async with aclosing(items):
+                async for item in items:
+                    queue.put_nowait(item)
+        finally:
+            queue.put_nowait(None)
+
+    async def _astream_items(
+        self,
+        client: AsyncOpenAI,
+        config: LLMConfig,
+        system_prompt: str,
+        instruction_prompt: str,
+        response_model: Type[TBaseModel],
+        field: str,
+        priority: Priority,
+        game_id: int | None,
+        stage: str | None,
+        on_usage: Callable[[int], None] | None,
+        key: str | None,
+    ) -> AsyncGenerator[BaseModel, None]:
+        item_model: Type[BaseModel] = get_args(response_model.model_fields[field].annotation)[0]
+        parser: StreamingArrayParser[BaseModel] = StreamingArrayParser(field, item_model)
+        name: str = response_model.__name__
+        stage = stage or name
+        num_items: int = 0
+        content: List[str] = []  # the complete response is only cached if the stream was not aborted
+        completion_tokens: int | None = None
+        prompt_tokens: int = estimate_tokens(system_prompt) + estimate_tokens(instruction_prompt)
+        async with self.gateway.acquire(
+            config.base_model, priority, game_id, prompt_tokens + self.COMPLETION_TOKENS_ESTIMATE
+        ) as permit:
+            start: float = time.perf_counter()
+            Metrics.increment(f"llm.{stage}.streams")
+            Metrics.increment(f"llm.{stage}.estimated_prompt_tokens", prompt_tokens)
+            try:
+                async with client.beta.chat.completions.stream(
+                    model=config.base_model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": system_prompt,
+                        },
+                        {
+                            "role": "user",
+                            "content": instruction_prompt,
+                        },
+                    ],
+                    temperature=config.temperature,
+                    response_format=response_model,
+                    stream_options={"include_usage": True},
+                ) as stream:
+                    async for event in stream:
+                        if event.type == "content.delta":
+                            content.append(event.delta)
+                            for item in parser.feed(event.delta):
+                                if num_items == 0:
+                                    Metrics.observe(
+                                        f"llm.{name}.first_item_latency", time.perf_counter() - start
+                                    )
+                                num_items += 1
+                                yield item
+                        elif event.type == "chunk" and event.chunk.usage is not None:
+                            permit.used_tokens = event.chunk.usage.total_tokens
+                            completion_tokens = event.chunk.usage.completion_tokens
+                            self.record_usage(stage, event.chunk.usage)
+                if key is not None and content:
+                    await self.cache.put(key, "".join(content))
+            except (GeneratorExit, asyncio.CancelledError):
+                Metrics.increment(f"llm.{name}.aborted")
+                if stage != name:
+                    Metrics.increment(f"llm.{stage}.aborted")
+                raise
+            except Exception as e:
+                self.logger.error(f"Failed to stream response: {e}")
+                Metrics.increment(f"llm.{name}.errors")
+                self.on_error(e, permit)
+            finally:
+                Metrics.observe(f"llm.{name}.latency", time.perf_counter() - start)
+                Metrics.increment(f"llm.{name}.calls")
+                if on_usage is not None and (completion_tokens is not None or content):
+                    on_usage(
+                        completion_tokens
+                        if completion_tokens is not None
+                        else estimate_tokens("".join(content))
+                    )
+
+    def cache_key(
+        self, config: LLMConfig, system_prompt: str, instruction_prompt: str, response_model: Type[BaseModel]
+    ) -> str:
+        schema: str | None = self._schemas.get(response_model)
+        if schema is None:
+            schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+            self._schemas[response_model] = schema
+        return self.cache.key(
+            config.base_model, config.temperature, system_prompt, instruction_prompt, schema
+        )
+
+    def estimate_tokens(self, system_prompt: str, instruction_prompt: str) -> int:
+        """Token estimate of a call including the expected completion."""
+        prompt_tokens: int = estimate_tokens(system_prompt) + estimate_tokens(instruction_prompt)
+        return prompt_tokens + self.COMPLETION_TOKENS_ESTIMATE
+
+    @staticmethod
+    def record_usage(stage: str, usage: CompletionUsage) -> None:
+        """Count the tokens of a completion of `stage`, including the prompt tokens served from the provider's
+        cache."""
+        Metrics.increment(f"llm.{stage}.prompt_tokens", usage.prompt_tokens)
+        Metrics.increment(f"llm.{stage}.completion_tokens", usage.completion_tokens)
+        details: PromptTokensDetails | None = usage.prompt_tokens_details
+        cached: int = (details.cached_tokens or 0) if details is not None else 0
+        Metrics.increment(f"llm.{stage}.cached_tokens", cached)
+        if usage.prompt_tokens:
+            Metrics.observe(f"llm.{stage}.cache_hit_rate", cached / usage.prompt_tokens)
+
+    def on_error(self, error: Exception, permit: GatewayPermit) -> None:
+        if isinstance(error, RateLimitError):
+            retry_after: str | None = error.response.headers.get("retry-after")
+            self.gateway.throttle(permit.model, float(retry_after) if retry_after else 1.0)
@@ -0,0 +1,54 @@
+"""Submodule assembling the prompts of all LLM stages with a prefix shared across games.
+
+Providers cache the longest prompt prefix they have recently seen, so every value that differs between games
+is kept out of the system prompt. The system prompt of a stage is rendered once at import and is identical
+for all calls of the stage, only the instruction carries per-game values.
+"""
+
+from typing import Any
+
+from fourmind.bot.services import prompts
+
+__all__ = ["StagePrompt", "FOUR_SIDES", "FOUR_SIDES_BATCH", "SUMMARY", "SIMULATION"]
+
+
+class StagePrompt:
+    """The static system prompt and the per-game instruction template of one LLM stage."""
+
+    __slots__ = ("stage", "system", "instruction_template")
+
+    def __init__(self, stage: str, system_template: str, instruction_template: str, **static: str) -> None:
+        self.stage: str = stage  # token usage and prompt cache hits are counted per stage
+        self.system: str = system_template.format(**static)
+        self.instruction_template: str = instruction_template
+
+    def instruction(self, **values: Any) -> str:
+        return self.instruction_template.format(**values)
+
+
+FOUR_SIDES: StagePrompt = StagePrompt(
+    "four_sides",
+    prompts.FourSidesAnalysisPrompts.system,
+    prompts.FourSidesAnalysisPrompts.instruction,
+    game_description=prompts.GeneralPrompts.game,
+)
+# same system prompt as single analyses, so both share the cached prefix
+FOUR_SIDES_BATCH: StagePrompt = StagePrompt(
+    "four_sides_batch",
+    prompts.FourSidesAnalysisPrompts.system,
+    prompts.FourSidesAnalysisPrompts.batch_instruction,
+    game_description=prompts.GeneralPrompts.game,
+)
+SUMMARY: StagePrompt = StagePrompt(
+    "summary",
+    prompts.SummaryPrompts.system,
+    prompts.SummaryPrompts.instruction,
+    game_description=prompts.GeneralPrompts.game,
+)
+SIMULATION: StagePrompt = StagePrompt(
+    "simulation",
+    prompts.ResponseGenerationPrompts.system,
+    prompts.ResponseGenerationPrompts.instruction,
+    game_description=prompts.GeneralPrompts.game,
+    behavior=prompts.GeneralPrompts.behavior,
+)
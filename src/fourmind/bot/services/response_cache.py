@@ -0,0 +1,230 @@
+"""Submodule implementing an exact-match cache of LLM responses."""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from enum import Enum
+from logging import Logger
+from typing import Dict, List, Pattern, Tuple
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+
+__all__ = ["CacheMode", "ResponseCache"]
+
+
+class CacheMode(Enum):
+    OFF = "off"
+    READ_WRITE = "read_write"  # serve cached responses and store new ones
+    RECORD = "record"  # always call the LLM and store its responses for replays, e.g. to capture fixtures
+    REPLAY = "replay"  # like read_write, but keyed independently of the temperature and the wall clock
+
+
+class ResponseCache:
+    """Content-addressed cache of LLM responses with an in-memory LRU tier and an on-disk tier.
+
+    Responses are keyed by model, temperature, prompts and response schema, so a replay with the same inputs
+    runs without any LLM call. Both tiers are bounded in bytes and evict the least recently used entries.
+    Each chat draws a random temperature and its prompts carry the chat start time and the message ages, so
+    the RECORD and REPLAY modes leave out the temperature and replace the times by placeholders. Failures of
+    the disk tier are logged and never fail the LLM call.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    DEFAULT_PATH: str = os.path.abspath(os.path.join("data", "llm_cache"))
+
+    __timestamp_pattern__: Pattern[str] = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+    __age_pattern__: Pattern[str] = re.compile(r"\(\d+ (sec|min|hr) ago\)")
+    # the participants of the four-sides prompts are listed in random order
+    __participants_pattern__: Pattern[str] = re.compile(r"^(# Participants\n)(.+)$", re.MULTILINE)
+
+    def __init__(
+        self,
+        mode: CacheMode = CacheMode.READ_WRITE,
+        path: str | None = DEFAULT_PATH,
+        max_memory_bytes: int = 32 * 1024**2,
+        max_disk_bytes: int = 512 * 1024**2,
+    ) -> None:
+        self.mode: CacheMode = mode
+        self.path: str | None = path
+        self.max_memory_bytes: int = max_memory_bytes
+        self.max_disk_bytes: int = max_disk_bytes
+
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_bytes: int = 0
+        # file sizes of the disk tier in LRU order, disk accesses run in a worker thread
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes: int = 0
+        self._stats: Dict[str, int] = {
+            "hits.memory": 0,
+            "hits.disk": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "write_errors": 0,
+        }
+
+        if self.mode is not CacheMode.OFF and self.path is not None:
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                self._load_index()
+            except OSError as e:
+                self.logger.error(
+                    f"Response cache path {self.path} is not usable, caching in memory only: {e}"
+                )
+                self.path = None
+                self._disk.clear()
+                self._disk_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not CacheMode.OFF
+
+    @property
+    def normalized(self) -> bool:
+        """Whether keys leave out the temperature and the wall-clock times of the prompts."""
+        return self.mode is CacheMode.RECORD or self.mode is CacheMode.REPLAY
+
+    def key(
+        self, model: str, temperature: float, system_prompt: str, instruction_prompt: str, schema: str
+    ) -> str:
+        payload: str
+        if self.normalized:
+            payload = json.dumps(
+                [model, self.normalize(system_prompt), self.normalize(instruction_prompt), schema]
+            )
+        else:
+            payload = json.dumps([model, temperature, system_prompt, instruction_prompt, schema])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @classmethod
+    def normalize(cls, prompt: str) -> str:
+        """Replace the chat start time and the message ages of a prompt by placeholders and sort the
+        participants."""
+        prompt = cls.__age_pattern__.sub("(? ago)", cls.__timestamp_pattern__.sub("<time>", prompt))
+        return cls.__participants_pattern__.sub(
+            lambda match: match.group(1) + ", ".join(sorted(match.group(2).split(", "))), prompt
+        )
+
+    async def get(self, key: str) -> str | None:
+        """The cached response for `key`, or None on a miss or if the cache is not read from."""
+        if self.mode is not CacheMode.READ_WRITE and self.mode is not CacheMode.REPLAY:
+            return None
+
+        value: str | None = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self._hit("hits.memory")
+            return value
+
+        if key in self._disk:
+            value = await asyncio.to_thread(self._read_file, key)
+            if value is not None:
+                self._disk.move_to_end(key)
+                self._remember(key, value)
+                self._hit("hits.disk")
+                return value
+            self._disk_bytes -= self._disk.pop(key, 0)  # removed from disk by someone else
+
+        self._stats["misses"] += 1
+        Metrics.increment("llm_cache.misses")
+        return None
+
+    async def put(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return None
+        self._remember(key, value)
+        self._stats["stores"] += 1
+        Metrics.increment("llm_cache.stores")
+
+        if self.path is None:
+            return None
+        size: int = len(value.encode())
+        self._disk_bytes += size - self._disk.pop(key, 0)
+        self._disk[key] = size
+        evicted: List[str] = []
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            old_key, old_size = self._disk.popitem(last=False)
+            self._disk_bytes -= old_size
+            evicted.append(old_key)
+        self._evicted(len(evicted))
+        try:
+            await asyncio.to_thread(self._write_file, key, value, evicted)
+        except OSError as e:
+            # the response is still served from memory, only the disk tier misses it
+            self.logger.error(f"Failed to write cached response {key}: {e}")
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._stats["write_errors"] += 1
+            Metrics.increment("llm_cache.write_errors")
+
+    def stats(self) -> Dict[str, float]:
+        """Hit and miss counts, the hit rate and the size of both tiers."""
+        lookups: int = self._stats["hits.memory"] + self._stats["hits.disk"] + self._stats["misses"]
+        hits: int = self._stats["hits.memory"] + self._stats["hits.disk"]
+        return {
+            **self._stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory.entries": len(self._memory),
+            "memory.bytes": self._memory_bytes,
+            "disk.entries": len(self._disk),
+            "disk.bytes": self._disk_bytes,
+        }
+
+    def _hit(self, tier: str) -> None:
+        self._stats[tier] += 1
+        Metrics.increment(f"llm_cache.{tier}")
+
+    def _evicted(self, count: int) -> None:
+        if count:
+            self._stats["evictions"] += count
+            Metrics.increment("llm_cache.evictions", count)
+
+    def _remember(self, key: str, value: str) -> None:
+        previous: str | None = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        evicted: int = 0
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, old_value = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_value)
+            evicted += 1
+        self._evicted(evicted)
+
+    def _file(self, key: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, f"{key}.json")
+
+    def _load_index(self) -> None:
+        entries: List[Tuple[float, str, int]] = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat: os.stat_result = entry.stat()
+                entries.append((stat.st_mtime, entry.name.removesuffix(".json"), stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self.logger.info(f"Loaded {len(self._disk)} cached LLM responses from {self.path}")
+
+    def _read_file(self, key: str) -> str | None:
+        try:
+            with open(self._file(key)) as file:
+                value: str = file.read()
+            os.utime(self._file(key))  # keeps the LRU order across restarts
+            return value
+        except OSError:
+            return None
+
+    def _write_file(self, key: str, value: str, evicted: List[str]) -> None:
+        with open(self._file(key), "w") as file:
+            file.write(value)
+        for old_key in evicted:
+            try:
+                os.remove(self._file(old_key))
+            except OSError:
+                pass
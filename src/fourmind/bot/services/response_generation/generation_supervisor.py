@@ -0,0 +1,87 @@
+"""Submodule supervising the speculative response generation of each game."""
+
+import asyncio
+from logging import Logger
+from typing import Callable
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.branch import SimulatedBranch
+from fourmind.bot.models.session import GameSession
+from fourmind.bot.services.response_generation.lookahead import Lookahead, SimulationConfig
+from fourmind.bot.services.response_generation.prediction import BranchPredictor
+from fourmind.bot.services.response_generation.reply_planner import ReplyPlan
+
+__all__ = ["GenerationSupervisor"]
+
+
+class GenerationSupervisor:
+    """Keeps at most one response generation per game in flight, always the freshest one.
+
+    A generation is started as soon as a message arrives. If a newer message arrives before it has finished,
+    the outdated generation is cancelled together with its pending LLM call and superseded by a new one,
+    so only a reply based on the latest chat history is ever delivered.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    def __init__(self, lookahead: Lookahead, predictor: BranchPredictor | None = None) -> None:
+        self.lookahead: Lookahead = lookahead
+        self.predictor: BranchPredictor = predictor or BranchPredictor()
+
+    async def generate(
+        self,
+        session: GameSession,
+        proactive: bool = False,
+        timeout: float | None = None,
+        plan: ReplyPlan | None = None,
+        accept: Callable[[str], bool] | None = None,
+    ) -> str | None:
+        """Generate a reply for the current chat history of the session within `timeout` seconds.
+
+        The model, the simulation horizon and the prediction depth are taken from `plan` if given, otherwise
+        the chat's model and the default horizon are used without a prediction.
+        The messages simulated after a reply replace the session's branch, see `BranchPredictor`.
+        Replies to messages race `SimulationConfig.num_candidates` simulations, the first reply passing
+        `accept` wins.
+
+        Returns:
+            str | None: the reply, or None if the simulation failed or was superseded by a newer one.
+        """
+        self.supersede(session)
+        task: asyncio.Task[SimulatedBranch | None] = asyncio.create_task(
+            self.lookahead.simulate_branch_async(
+                session.chat,
+                proactive=proactive,
+                timeout=timeout,
+                config=plan.config if plan is not None else None,
+                num_simulated_messages=plan.num_simulated_messages if plan is not None else None,
+                prediction_depth=plan.prediction_depth if plan is not None and not proactive else 0,
+                candidates=1 if proactive else SimulationConfig.num_candidates,
+                accept=accept,
+            )
+        )
+        session.generation_task = task
+        try:
+            branch: SimulatedBranch | None = await task
+            if branch is None:
+                return None
+            self.predictor.keep(session, branch)
+            return branch.reply
+        except asyncio.CancelledError:
+            current: asyncio.Task[object] | None = asyncio.current_task()
+            if current is not None and current.cancelling() > 0:
+                raise  # the caller itself is cancelled
+            return None
+        finally:
+            if session.generation_task is task:
+                session.generation_task = None
+
+    def supersede(self, session: GameSession) -> None:
+        """Cancel the generation in flight for the session, if any."""
+        task: asyncio.Task[SimulatedBranch | None] | None = session.generation_task
+        session.generation_task = None
+        if task is not None and not task.done():
+            self.logger.debug(f"{str(session)} Superseding outdated generation")
+            task.cancel()
+            Metrics.increment("generation.superseded")
@@ -1,15 +1,25 @@
 """Response generation module for performing simulation lookahead."""
 
+import asyncio
+import time
+from contextlib import aclosing
 from dataclasses import dataclass
 from logging import Logger
+from typing import AsyncGenerator, Awaitable, Callable, List
 
 from openai import AsyncOpenAI
+from pydantic import BaseModel
 
 from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.branch import SimulatedBranch
 from fourmind.bot.models.chat import Chat
-from fourmind.bot.models.inference import ChatSimulationReponse
+from fourmind.bot.models.inference import ChatSimulationMessage, ChatSimulationReponse
 from fourmind.bot.services import prompts
-from fourmind.bot.services.llm_inference import LLMInference
+from fourmind.bot.services.llm_gateway import LLMGateway, Priority
+from fourmind.bot.services.llm_inference import LLMConfig, LLMInference
+from fourmind.bot.services.prompt_assembly import SIMULATION
+from fourmind.bot.services.response_cache import ResponseCache
 
 __all__ = ["Lookahead"]
 
@@ -17,43 +27,273 @@ __all__ = ["Lookahead"]
 @dataclass
 class SimulationConfig:
     num_simulated_messages: int = 5
+    # act on the first simulated message as soon as it is streamed and abort the rest of the simulation
+    streaming: bool = True
+    # estimated tokens of the chat history in the prompt, older messages are shortened or collapsed to fit
+    history_token_budget: int | None = 3000
+    # choose the number of simulated messages per reply, see ReplyPlanner.horizon, instead of always the above
+    adaptive_horizon: bool = True
+    # simulated messages kept after the reply to be served if the humans follow the prediction, 0 disables it
+    prediction_depth: int = 2
+    # simulations raced per reply, the first acceptable reply wins and the others are cancelled, 1 disables it
+    num_candidates: int = 1
 
 
 class Lookahead(LLMInference):
     logger: Logger = LoggerFactory.setup_logger(__name__)
 
-    def __init__(self, client: AsyncOpenAI) -> None:
+    def __init__(
+        self, client: AsyncOpenAI, gateway: LLMGateway | None = None, cache: ResponseCache | None = None
+    ) -> None:
+        super().__init__(gateway, cache)
         self.client: AsyncOpenAI = client
 
-    async def simulate_chat_async(self, chat_ref: Chat, proactive: bool = False) -> str | None:
+    async def simulate_chat_async(
+        self,
+        chat_ref: Chat,
+        proactive: bool = False,
+        timeout: float | None = None,
+        config: LLMConfig | None = None,
+        num_simulated_messages: int | None = None,
+    ) -> str | None:
+        """Simulate the next messages of the chat and return the first one if it is the bot's.
+
+        Args:
+            timeout: seconds until the simulation is given up. Replies to messages are hedged on the fallback
+                model once the simulation is slower than usual, proactive messages are not urgent.
+            config: the model to simulate with, defaults to the one of the chat.
+            num_simulated_messages: the simulation horizon, defaults to `SimulationConfig`.
+        """
+        branch: SimulatedBranch | None = await self.simulate_branch_async(
+            chat_ref, proactive, timeout, config, num_simulated_messages
+        )
+        return branch.reply if branch is not None else None
+
+    async def simulate_branch_async(
+        self,
+        chat_ref: Chat,
+        proactive: bool = False,
+        timeout: float | None = None,
+        config: LLMConfig | None = None,
+        num_simulated_messages: int | None = None,
+        prediction_depth: int = 0,
+        candidates: int = 1,
+        accept: Callable[[str], bool] | None = None,
+    ) -> SimulatedBranch | None:
+        """Like `simulate_chat_async`, but keep up to `prediction_depth` simulated messages after the reply.
+
+        When streaming, the branch is returned as soon as its first message is complete and the predicted
+        messages are streamed into it in the background. With several `candidates`, see `race_candidates`.
+        """
         self.logger.info(f"Simulating chat for {str(chat_ref)}")
         # self.logger.info(f"Chat history: {chat_ref.get_formatted_chat_history(5, simple=True)}")
-        response: ChatSimulationReponse | None = await self.ainfer(
-            client=self.client,
-            config=chat_ref.llmconfig,
-            system_prompt=prompts.ResponseGenerationPrompts.system.format(
-                game_description=prompts.GeneralPrompts.game,
-                behavior=prompts.GeneralPrompts.behavior,
-                target_user=chat_ref.humans[0],
-                blamed_user=chat_ref.humans[1],
-                ai_user=chat_ref.bot,
+        horizon: int = num_simulated_messages or SimulationConfig.num_simulated_messages
+        system_prompt: str = SIMULATION.system
+        instruction_prompt: str = SIMULATION.instruction(
+            target_user=chat_ref.humans[0],
+            blamed_user=chat_ref.humans[1],
+            ai_user=chat_ref.bot,
+            num_simulated_messages=horizon,
+            chat_history=chat_ref.get_formatted_chat_history(
+                token_budget=SimulationConfig.history_token_budget, summarized=True
             ),
-            instruction_prompt=prompts.ResponseGenerationPrompts.instruction.format(
-                num_simulated_messages=SimulationConfig.num_simulated_messages,
-                chat_history=chat_ref.get_formatted_chat_history(),
-                proactive_behavior=(
-                    prompts.ResponseGenerationPrompts.proactive.format(ai_user=chat_ref.bot)
-                    if proactive
-                    else ""
-                ),
+            proactive_behavior=(
+                prompts.ResponseGenerationPrompts.proactive.format(ai_user=chat_ref.bot) if proactive else ""
             ),
-            response_model=ChatSimulationReponse,
         )
 
-        if response is None:
+        priority: Priority = Priority.PROACTIVE if proactive else Priority.RESPONSE
+        # proactive messages share the prompt prefix with replies, but their usage is reported separately
+        stage: str = f"{SIMULATION.stage}.proactive" if proactive else SIMULATION.stage
+
+        def count_usage(completion_tokens: int) -> None:
+            Metrics.increment(f"lookahead.horizon.{horizon}.completion_tokens", completion_tokens)
+
+        async def attempt(config: LLMConfig) -> SimulatedBranch | None:
+            if SimulationConfig.streaming:
+                return await self.stream_branch_async(
+                    system_prompt,
+                    instruction_prompt,
+                    chat_ref,
+                    priority,
+                    config,
+                    prediction_depth,
+                    stage,
+                    on_usage=count_usage,
+                )
+            response: ChatSimulationReponse | None = await self.ainfer(
+                client=self.client,
+                config=config,
+                system_prompt=system_prompt,
+                instruction_prompt=instruction_prompt,
+                response_model=ChatSimulationReponse,
+                priority=priority,
+                game_id=chat_ref.id,
+                stage=stage,
+                on_usage=count_usage,
+            )
+            if response is None or not response.messages:
+                return None
+            branch: SimulatedBranch = self.to_branch(response.messages[0], chat_ref.bot)
+            if branch.reply is not None:
+                branch.upcoming.extend(response.messages[1 : 1 + prediction_depth])
+            else:
+                branch.upcoming.extend(response.messages[1:prediction_depth])
+            return branch
+
+        start: float = time.perf_counter()
+        branch: SimulatedBranch | None
+        if candidates > 1:
+            branch = await self.race_candidates(
+                attempt, config or chat_ref.llmconfig, candidates, timeout=timeout, accept=accept
+            )
+        else:
+            branch = await self.arace(
+                "ChatSimulationReponse.first_message",
+                attempt,
+                config or chat_ref.llmconfig,
+                timeout=timeout,
+                hedge=not proactive,
+                variant=f"horizon.{horizon}",
+                discard=SimulatedBranch.discard,
+            )
+        if branch is None:
             return None
+        branch.latency = time.perf_counter() - start
+
+        # quality proxies per horizon, only a simulation starting with the bot's message yields a reply
+        Metrics.observe(f"lookahead.horizon.{horizon}.latency", branch.latency)
+        Metrics.increment(f"lookahead.horizon.{horizon}.calls")
+        if branch.reply is not None:
+            self.logger.debug(f"{str(chat_ref)} {chat_ref.bot}: {branch.reply}")
+            Metrics.increment(f"lookahead.horizon.{horizon}.bot_first")
+        return branch
+
+    async def race_candidates(
+        self,
+        attempt: Callable[[LLMConfig], Awaitable[SimulatedBranch | None]],
+        config: LLMConfig,
+        candidates: int,
+        timeout: float | None = None,
+        accept: Callable[[str], bool] | None = None,
+    ) -> SimulatedBranch | None:
+        """Run several simulations at once and return the first one with an acceptable reply.
+
+        The first candidate uses `config` and the others draw their own temperature, so the candidates differ.
+        Once a reply passes `accept`, the remaining simulations are cancelled. If no candidate yields an
+        acceptable reply, the first simulation starting with a human message is returned for its prediction.
+        """
+        configs: List[LLMConfig] = [config]
+        configs.extend(LLMConfig(base_model=config.base_model) for _ in range(candidates - 1))
+        tasks: List[asyncio.Task[SimulatedBranch | None]] = [
+            asyncio.create_task(attempt(candidate)) for candidate in configs
+        ]
+        Metrics.increment("lookahead.candidates.replies")
+        winner: SimulatedBranch | None = None
+        fallback: SimulatedBranch | None = None
+        try:
+            for rank, next_done in enumerate(asyncio.as_completed(tasks, timeout=timeout)):
+                branch: SimulatedBranch | None
+                try:
+                    branch = await next_done
+                except TimeoutError:
+                    raise
+                except Exception as e:
+                    self.logger.error(f"Simulation candidate failed: {e!r}")
+                    continue
+                if branch is None:
+                    continue
+                if branch.reply is None:
+                    if fallback is None:
+                        fallback = branch
+                    else:
+                        branch.discard()
+                    continue
+                if accept is not None and not accept(branch.reply):
+                    Metrics.increment("lookahead.candidates.rejected")
+                    branch.discard()
+                    continue
+                winner = branch
+                Metrics.observe("lookahead.candidates.winner_rank", rank)
+                break
+        except TimeoutError:
+            Metrics.increment("lookahead.candidates.deadline_exceeded")
+        finally:
+            cancelled: int = 0
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    cancelled += 1
+                elif not task.cancelled() and task.exception() is None:
+                    # finished at the same time as the winner, its streaming branch must not keep running
+                    result: SimulatedBranch | None = task.result()
+                    if result is not None and result is not winner and result is not fallback:
+                        result.discard()
+            Metrics.increment("lookahead.candidates.cancelled", cancelled)
+
+        if winner is None:
+            Metrics.increment("lookahead.candidates.exhausted")
+            return fallback
+        if fallback is not None:
+            fallback.discard()
+        return winner
+
+    async def stream_branch_async(
+        self,
+        system_prompt: str,
+        instruction_prompt: str,
+        chat_ref: Chat,
+        priority: Priority,
+        config: LLMConfig | None = None,
+        prediction_depth: int = 0,
+        stage: str = SIMULATION.stage,
+        on_usage: Callable[[int], None] | None = None,
+    ) -> SimulatedBranch | None:
+        """Stream the simulation until its first message is complete.
+
+        Up to `prediction_depth` further messages are streamed into the branch by a background task, the rest
+        of the simulation is aborted.
+        """
+        messages: AsyncGenerator[BaseModel, None] = self.astream_items(
+            client=self.client,
+            config=config or chat_ref.llmconfig,
+            system_prompt=system_prompt,
+            instruction_prompt=instruction_prompt,
+            response_model=ChatSimulationReponse,
+            field="messages",
+            priority=priority,
+            game_id=chat_ref.id,
+            stage=stage,
+            on_usage=on_usage,
+        )
+        try:
+            first_message: BaseModel | None = await anext(messages, None)
+        except BaseException:
+            await messages.aclose()
+            raise
+        if first_message is None:
+            await messages.aclose()
+            return None
+
+        branch: SimulatedBranch = self.to_branch(first_message, chat_ref.bot)  # type: ignore[arg-type]
+        if len(branch.upcoming) < prediction_depth:
+            branch.task = asyncio.create_task(self._stream_upcoming_async(messages, branch, prediction_depth))
+        else:
+            await messages.aclose()
+        return branch
+
+    @staticmethod
+    async def _stream_upcoming_async(
+        messages: AsyncGenerator[BaseModel, None], branch: SimulatedBranch, prediction_depth: int
+    ) -> None:
+        async with aclosing(messages):
+            async for message in messages:
+                branch.upcoming.append(message)  # type: ignore[arg-type]
+                if len(branch.upcoming) >= prediction_depth:
+                    break
 
-        self.logger.debug(f"{str(chat_ref)} {response.messages[0].sender}: {response.messages[0].message}")
-        if response.messages[0].sender == chat_ref.bot:
-            return response.messages[0].message
-        return None
+    @staticmethod
+    def to_branch(first_message: ChatSimulationMessage, bot: str) -> SimulatedBranch:
+        if first_message.sender == bot:
+            return SimulatedBranch(first_message.message, [])
+        return SimulatedBranch(None, [first_message])
@@ -18,6 +18,13 @@ class MessageTimeSimulator:
 
     logger: Logger = LoggerFactory.setup_logger(__name__)
 
+    AVERAGE_KEYSTROKE_TIME: float = 0.238656
+    # typical reply of the bot, used to budget the generation before the reply is known
+    EXPECTED_REPLY_LENGTH: int = 40
+    EXPECTED_REPLY_WORDS: int = 8
+    # the generation is never given less time than this, even if the human-like delay has already passed
+    MIN_RESPONSE_BUDGET: float = 3.0
+
     def __init__(self) -> None: ...
 
     def get_message_writing_time(self, message: str) -> float:
@@ -26,7 +33,7 @@ class MessageTimeSimulator:
         Values are taken from the following sources:
         - https://dl.acm.org/doi/10.1145/3173574.3174220
         """
-        average_keystroke_time: float = max(0.06, random.gauss(0.238656, 0.1116))
+        average_keystroke_time: float = max(0.06, random.gauss(self.AVERAGE_KEYSTROKE_TIME, 0.1116))
         return average_keystroke_time * len(message)
 
     def get_cognitive_response_time(self, message: str, previous_message: str) -> float:
@@ -71,3 +78,24 @@ class MessageTimeSimulator:
         )
         self.logger.debug(f"Remaining response time: {total_response_time} seconds")
         return total_response_time
+
+    def get_response_budget(self, start_time: DateTime, chat_ref: Chat) -> float:
+        """Seconds left to generate a reply before a human would typically have answered.
+
+        The budget is the expected time to read the last message and write a typical reply, less the time
+        that has already passed since the message arrived, but at least `MIN_RESPONSE_BUDGET`.
+        """
+        last_n_messages: List[Message] = chat_ref.get_last_n_messages(1)
+        actor_message: str = (
+            last_n_messages[0].message
+            if (last_n_messages and last_n_messages[0].sender != chat_ref.bot)
+            else ""
+        )
+        expected_reply: str = " ".join(["word"] * self.EXPECTED_REPLY_WORDS)
+        elapsed_time: float = (DateTime.now() - start_time).total_seconds()
+        budget: float = (
+            self.AVERAGE_KEYSTROKE_TIME * self.EXPECTED_REPLY_LENGTH
+            + self.get_cognitive_response_time(expected_reply, actor_message)
+            - elapsed_time
+        )
+        return max(self.MIN_RESPONSE_BUDGET, budget)
@@ -0,0 +1,109 @@
+"""Submodule reusing simulated chat continuations when the humans follow them."""
+
+import re
+from logging import Logger
+from typing import Callable, List, Pattern, Set
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.branch import SimulatedBranch
+from fourmind.bot.models.chat import ChatMessage
+from fourmind.bot.models.inference import ChatSimulationMessage
+from fourmind.bot.models.session import GameSession
+
+__all__ = ["BranchPredictor"]
+
+
+class BranchPredictor:
+    """Serves the bot's simulated answer to a predicted human message without a new LLM call.
+
+    The lookahead simulates a human message and the bot's answer after the reply it generates. Once the
+    reply has been delivered, the branch waits for the next human message. If that message is similar to the
+    predicted one by `similarity`, the simulated answer is served right away, otherwise the branch is
+    discarded.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    SIMILARITY_THRESHOLD: float = 0.6
+
+    __words__: Pattern[str] = re.compile(r"\w+")
+
+    def keep(self, session: GameSession, branch: SimulatedBranch) -> None:
+        """Replace the session's branch by the freshly simulated `branch` if it predicts an exchange."""
+        self.discard(session)
+        if len(branch.upcoming) < 2 and not branch.streaming:
+            return None
+        if branch.reply is None:
+            # the simulation starts with a human message, it continues the chat as it is now
+            branch.after_id = session.chat.last_message_id
+        session.branch = branch
+
+    def delivered(
+        self, session: GameSession, branch: SimulatedBranch | None, message: ChatMessage | None
+    ) -> None:
+        """Attach `branch` to the reply `message` it was simulated with, once the reply is in the chat."""
+        if branch is None or message is None or session.branch is not branch:
+            return None
+        if branch.after_id is None:
+            branch.after_id = message.id
+
+    def match(
+        self, session: GameSession, message: ChatMessage, accept: Callable[[str], bool] | None = None
+    ) -> str | None:
+        """The simulated answer to the human `message` if it was predicted, the branch is consumed either way.
+
+        An answer that does not pass `accept` is not served, so that the reply is generated instead. A hit
+        leaves the remaining upcoming messages in the branch, waiting for the answer to be delivered.
+        """
+        branch: SimulatedBranch | None = session.branch
+        if branch is None:
+            return None
+        Metrics.increment("prediction.lookups")
+        upcoming: List[ChatSimulationMessage] = branch.upcoming
+        if branch.after_id != message.id - 1:
+            Metrics.increment("prediction.stale")  # the reply was not delivered or other messages came first
+            self.discard(session)
+            return None
+        if len(upcoming) < 2:
+            Metrics.increment("prediction.incomplete")
+            self.discard(session)
+            return None
+
+        predicted, answer = upcoming[0], upcoming[1]
+        bot: str = session.chat.bot
+        if (
+            predicted.sender == bot
+            or answer.sender != bot
+            or self.similarity(predicted.message, message.message) < self.SIMILARITY_THRESHOLD
+        ):
+            Metrics.increment("prediction.misses")
+            self.discard(session)
+            return None
+        if accept is not None and not accept(answer.message):
+            Metrics.increment("prediction.rejected")
+            self.discard(session)
+            return None
+
+        self.logger.debug(f"{str(session)} Predicted '{predicted.message}' for '{message.message}'")
+        Metrics.increment("prediction.hits")
+        Metrics.observe("prediction.latency_saved", branch.latency)
+        branch.upcoming = upcoming[2:]
+        branch.after_id = None
+        if not branch.upcoming and not branch.streaming:
+            session.branch = None
+        return answer.message
+
+    def discard(self, session: GameSession) -> None:
+        if session.branch is not None:
+            session.branch.discard()
+            session.branch = None
+
+    @classmethod
+    def similarity(cls, predicted: str, actual: str) -> float:
+        """Jaccard similarity of the words of both messages, ignoring case and punctuation."""
+        predicted_words: Set[str] = set(cls.__words__.findall(predicted.casefold()))
+        actual_words: Set[str] = set(cls.__words__.findall(actual.casefold()))
+        if not predicted_words or not actual_words:
+            return float(predicted.strip().casefold() == actual.strip().casefold())
+        return len(predicted_words & actual_words) / len(predicted_words | actual_words)
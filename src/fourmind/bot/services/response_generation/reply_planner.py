@@ -0,0 +1,211 @@
+"""Submodule choosing how each reply is generated within its latency budget."""
+
+import random
+import re
+from collections import deque
+from logging import Logger
+from typing import Deque, Dict, List, Pattern, Tuple
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.chat import Chat, Message
+from fourmind.bot.services.llm_inference import LLMConfig
+from fourmind.bot.services.response_generation.lookahead import SimulationConfig
+
+__all__ = ["ModelTier", "ReplyPlan", "ReplyPlanner"]
+
+
+class ModelTier:
+    """A way to generate a reply, from a local template up to the full lookahead on the game's model."""
+
+    __slots__ = ("name", "base_model", "num_simulated_messages", "prior_latency")
+
+    def __init__(
+        self, name: str, base_model: str | None, num_simulated_messages: int, prior_latency: float
+    ) -> None:
+        self.name: str = name
+        self.base_model: str | None = base_model  # None uses the model configured for the game
+        self.num_simulated_messages: int = num_simulated_messages  # 0 replies from a template
+        self.prior_latency: float = prior_latency  # assumed latency until enough replies were observed
+
+
+class ReplyPlan:
+    """The tier and simulation horizon chosen for one reply, together with its budget."""
+
+    __slots__ = ("tier", "budget", "config", "template", "num_simulated_messages", "prediction_depth")
+
+    def __init__(
+        self,
+        tier: ModelTier,
+        budget: float,
+        config: LLMConfig | None = None,
+        template: str | None = None,
+        num_simulated_messages: int | None = None,
+        prediction_depth: int = 0,
+    ) -> None:
+        self.tier: ModelTier = tier
+        self.budget: float = budget
+        self.config: LLMConfig | None = config
+        self.template: str | None = template
+        self.num_simulated_messages: int = (
+            num_simulated_messages if num_simulated_messages is not None else tier.num_simulated_messages
+        )
+        self.prediction_depth: int = prediction_depth  # simulated messages kept after the reply
+
+
+class ReplyPlanner:
+    """Picks the richest tier whose expected latency fits the time a human would take to answer.
+
+    Bare greetings early in the game are answered from a template without any LLM call. Every other message
+    gets the full lookahead if its observed `LATENCY_PERCENTILE` latency fits the budget, otherwise a shorter
+    simulation on `FAST_MODEL`. Messages that accuse someone of being the AI never get the fast tier, as
+    they decide the game. Replies that arrive after their budget are counted as budget misses.
+
+    Only the first simulated message is used, so the horizon is kept short unless strategy matters: fast
+    exchanges simulate a single message and ordinary messages `SHORT_HORIZON` messages. Accusations and the
+    decisive phase of a game get the tier's full horizon, unless the tier is too slow for the budget.
+    Only replies on the richest tier that leave time to spare and are not part of a fast exchange extend
+    their horizon by the messages kept for the `BranchPredictor`, all other replies predict nothing.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    FAST_MODEL: str = "gpt-4.1-nano-2025-04-14"
+    LATENCY_PERCENTILE: float = 95.0
+    LATENCY_MIN_SAMPLES: int = 10
+    LATENCY_WINDOW: int = 200
+    # the bot answers a greeting from a template only until it has sent this many messages
+    TEMPLATE_MAX_BOT_MESSAGES: int = 1
+
+    MIN_HORIZON: int = 1
+    SHORT_HORIZON: int = 2
+    # two messages closer together than this are a fast exchange
+    FAST_EXCHANGE_SECONDS: float = 8.0
+    # the recorded games of experiment/data.json last about 250 s in the median, the participants start to
+    # make up their minds in the last 100 s. FourMind.GAME_TIMEOUT is far longer, it only ends games that the
+    # server never ends.
+    DECISIVE_PHASE_SECONDS: float = 150.0
+    # a tier expected to spend more than this share of the budget only simulates a short horizon
+    LONG_HORIZON_BUDGET_SHARE: float = 0.5
+
+    TEMPLATE: ModelTier = ModelTier("template", None, 0, 0.0)
+    FAST: ModelTier = ModelTier("fast", FAST_MODEL, 2, 1.0)
+    FULL: ModelTier = ModelTier("full", None, SimulationConfig.num_simulated_messages, 2.0)
+    # LLM tiers from the richest to the fastest
+    TIERS: Tuple[ModelTier, ...] = (FULL, FAST)
+
+    GREETING_REPLIES: Tuple[str, ...] = ("hi", "hey", "hello", "hi there")
+    __greeting_pattern__: Pattern[str] = re.compile(
+        r"^\s*(hi+|hey+|hello+|hallo|servus|moin|yo|sup|hi there|hey there|hello there)\s*[!.?]*\s*$",
+        re.IGNORECASE,
+    )
+    __accusation_pattern__: Pattern[str] = re.compile(
+        r"\b(bot|ai|a\.i\.|robot|gpt|chatgpt|llm|machine|human|real person)\b", re.IGNORECASE
+    )
+
+    def __init__(self) -> None:
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def plan(self, chat: Chat, budget: float) -> ReplyPlan:
+        """Choose the tier for the reply to the newest message of `chat` within `budget` seconds."""
+        last_messages: List[Message] = chat.get_last_n_messages(1)
+        last_message: str = last_messages[0].message if last_messages else ""
+        if self.is_greeting(last_message) and self.bot_messages(chat) < self.TEMPLATE_MAX_BOT_MESSAGES:
+            template: str = random.choice(self.GREETING_REPLIES)
+            return self._planned(ReplyPlan(self.TEMPLATE, budget, template=template))
+
+        tier: ModelTier = self.TIERS[-1]
+        accusation: bool = self.__accusation_pattern__.search(last_message) is not None
+        if accusation:
+            tier = self.TIERS[0]
+        else:
+            for candidate in self.TIERS:
+                if self.expected_latency(candidate) <= budget:
+                    tier = candidate
+                    break
+        config: LLMConfig = chat.llmconfig
+        if tier.base_model is not None and tier.base_model != config.base_model:
+            config = LLMConfig(base_model=tier.base_model, temperature=config.temperature)
+        horizon: int = self.horizon(chat, tier, budget, accusation)
+        prediction_depth: int = self.prediction_depth(chat, tier, budget)
+        if prediction_depth:
+            # the predicted human message and the bot's answer to it are simulated after the reply
+            horizon = min(max(horizon, 1 + prediction_depth), tier.num_simulated_messages)
+            prediction_depth = min(prediction_depth, horizon - 1)
+        return self._planned(
+            ReplyPlan(
+                tier,
+                budget,
+                config=config,
+                num_simulated_messages=horizon,
+                prediction_depth=prediction_depth,
+            )
+        )
+
+    def horizon(self, chat: Chat, tier: ModelTier, budget: float, accusation: bool) -> int:
+        """Number of messages to simulate for a reply on `tier`."""
+        longest: int = tier.num_simulated_messages
+        if not SimulationConfig.adaptive_horizon:
+            return longest
+        horizon: int
+        if accusation or chat.duration.total_seconds() >= self.DECISIVE_PHASE_SECONDS:
+            horizon = longest
+        elif self.is_fast_exchange(chat):
+            horizon = self.MIN_HORIZON
+        else:
+            horizon = self.SHORT_HORIZON
+        if self.expected_latency(tier) > budget * self.LONG_HORIZON_BUDGET_SHARE:
+            horizon = min(horizon, self.SHORT_HORIZON)
+        return max(self.MIN_HORIZON, min(horizon, longest))
+
+    def prediction_depth(self, chat: Chat, tier: ModelTier, budget: float) -> int:
+        """Simulated messages to keep after the reply for the `BranchPredictor`, 0 if there is no time."""
+        if (
+            SimulationConfig.prediction_depth <= 0
+            or tier is not self.TIERS[0]
+            or self.is_fast_exchange(chat)
+            or self.expected_latency(tier) > budget * self.LONG_HORIZON_BUDGET_SHARE
+        ):
+            return 0
+        return SimulationConfig.prediction_depth
+
+    def is_fast_exchange(self, chat: Chat) -> bool:
+        last_messages: List[Message] = chat.get_last_n_messages(1)
+        if len(last_messages) < 2:
+            return False
+        return (last_messages[0].time - last_messages[1].time).total_seconds() < self.FAST_EXCHANGE_SECONDS
+
+    def report(self, plan: ReplyPlan, elapsed: float, completed: bool) -> None:
+        """Record how long the generation of a planned reply took.
+
+        Args:
+            elapsed: seconds from the arrival of the message until the reply was generated.
+            completed: False if the generation was superseded or failed, its latency is not representative.
+        """
+        Metrics.observe(f"generation.tier.{plan.tier.name}.latency", elapsed)
+        if elapsed > plan.budget:
+            missed_by: float = elapsed - plan.budget
+            self.logger.debug(f"Reply of tier {plan.tier.name} missed its budget by {missed_by:.1f}s")
+            Metrics.increment("generation.budget_missed")
+            Metrics.increment(f"generation.tier.{plan.tier.name}.budget_missed")
+        if completed and plan.tier.num_simulated_messages:
+            self._latencies.setdefault(plan.tier.name, deque(maxlen=self.LATENCY_WINDOW)).append(elapsed)
+
+    def expected_latency(self, tier: ModelTier) -> float:
+        window: Deque[float] | None = self._latencies.get(tier.name)
+        if window is None or len(window) < self.LATENCY_MIN_SAMPLES:
+            return tier.prior_latency
+        ordered: List[float] = sorted(window)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.LATENCY_PERCENTILE / 100))]
+
+    def is_greeting(self, message: str) -> bool:
+        return self.__greeting_pattern__.match(message) is not None
+
+    @staticmethod
+    def bot_messages(chat: Chat) -> int:
+        return sum(1 for message in chat.messages if message.sender == chat.bot)
+
+    @staticmethod
+    def _planned(plan: ReplyPlan) -> ReplyPlan:
+        Metrics.increment(f"generation.tier.{plan.tier.name}")
+        return plan
@@ -0,0 +1,99 @@
+"""Submodule implementing a single heap-based deadline scheduler shared by all games."""
+
+import asyncio
+import heapq
+import itertools
+from datetime import datetime as DateTime
+from logging import Logger
+from typing import Callable, List
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.timer import ScheduledTimer
+
+__all__ = ["DeadlineScheduler"]
+
+
+class DeadlineScheduler:
+    """Fires callbacks when their deadline expires, using one event loop timer for all games.
+
+    Timers are kept in a min-heap ordered by deadline. Only the earliest deadline is armed on the event loop,
+    so idle games cause no wakeups at all. Cancelled timers are dropped lazily when they reach the top of the
+    heap, and the heap is compacted once most of its entries are cancelled.
+
+    Callbacks run synchronously on the event loop and shall only spawn tasks for longer work.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    COMPACTION_THRESHOLD: int = 1024
+
+    def __init__(self) -> None:
+        self._heap: List[ScheduledTimer] = []
+        self._counter = itertools.count()
+        self._armed: asyncio.TimerHandle | None = None
+        self._armed_when: float = float("inf")
+        self._cancelled: int = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def schedule_in(self, delay: float, callback: Callable[[], None]) -> ScheduledTimer:
+        """Schedule `callback` to run in `delay` seconds."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        timer = ScheduledTimer(
+            loop.time() + max(0.0, delay), next(self._counter), callback, self._timer_cancelled
+        )
+        heapq.heappush(self._heap, timer)
+        if timer.when < self._armed_when:
+            self._arm(loop, timer.when)
+        return timer
+
+    def schedule_at(self, deadline: DateTime, callback: Callable[[], None]) -> ScheduledTimer:
+        """Schedule `callback` to run at the wall clock time `deadline`."""
+        return self.schedule_in((deadline - DateTime.now()).total_seconds(), callback)
+
+    def close(self) -> None:
+        if self._armed is not None:
+            self._armed.cancel()
+        for timer in self._heap:
+            timer._consume()
+        self._heap.clear()
+        self._armed = None
+        self._armed_when = float("inf")
+        self._cancelled = 0
+
+    def _timer_cancelled(self) -> None:
+        self._cancelled += 1
+        if self._cancelled > self.COMPACTION_THRESHOLD and self._cancelled > len(self._heap) // 2:
+            self._heap = [t for t in self._heap if not t.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def _arm(self, loop: asyncio.AbstractEventLoop, when: float) -> None:
+        if self._armed is not None:
+            self._armed.cancel()
+        self._armed = loop.call_at(when, self._run_due, loop)
+        self._armed_when = when
+
+    def _run_due(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._armed = None
+        self._armed_when = float("inf")
+        now: float = loop.time()
+        while self._heap and self._heap[0].when <= now:
+            timer: ScheduledTimer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                self._cancelled -= 1
+                continue
+            callback: Callable[[], None] | None = timer._consume()
+            Metrics.observe("scheduler.lateness", now - timer.when)
+            try:
+                callback()  # type: ignore[misc]
+            except Exception as e:
+                self.logger.exception(f"Scheduled callback failed: {e}")
+
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        if self._heap:
+            self._arm(loop, self._heap[0].when)
@@ -0,0 +1,116 @@
+"""Submodule queueing the messages of the bot until their simulated typing delay has passed."""
+
+import asyncio
+from datetime import datetime as DateTime
+from logging import Logger
+from typing import Awaitable, Callable, List
+
+from fourmind.bot.common.logger_factory import LoggerFactory
+from fourmind.bot.common.metrics import Metrics
+from fourmind.bot.models.branch import SimulatedBranch
+from fourmind.bot.models.outbound import OutboundMessage
+from fourmind.bot.models.session import GameSession
+from fourmind.bot.services.scheduling.deadline_scheduler import DeadlineScheduler
+
+__all__ = ["OutboundScheduler"]
+
+
+class OutboundScheduler:
+    """Delivers the messages of all games at their send deadline, using the shared `DeadlineScheduler`.
+
+    A message is queued as soon as it is generated, with the time a human would still need to type it as its
+    deadline, so no task waits during the typing delay. When a new message arrives, queued messages written
+    before it are withdrawn unless their deadline is less than `COMMIT_WINDOW` seconds away, as a human would
+    have sent them already. A newer reply replaces the queued messages in the same way. The follow-up half of
+    a split message is queued once the first half has been delivered.
+    """
+
+    logger: Logger = LoggerFactory.setup_logger(__name__)
+
+    COMMIT_WINDOW: float = 1.0
+
+    def __init__(
+        self,
+        scheduler: DeadlineScheduler,
+        deliver: Callable[[GameSession, OutboundMessage], Awaitable[None]],
+    ) -> None:
+        self.scheduler: DeadlineScheduler = scheduler
+        self.deliver: Callable[[GameSession, OutboundMessage], Awaitable[None]] = deliver
+
+    def enqueue(
+        self,
+        session: GameSession,
+        message: str,
+        delay: float,
+        kind: str,
+        origin: DateTime | None = None,
+        branch: SimulatedBranch | None = None,
+        followup: str | None = None,
+    ) -> OutboundMessage:
+        """Queue `message` to be delivered in `delay` seconds.
+
+        A reply replaces the messages queued before it, see `withdraw`.
+        """
+        if kind == "reply":
+            self.withdraw(session, reason="revised")
+        outbound = OutboundMessage(
+            message,
+            kind,
+            after_id=session.chat.last_message_id,
+            origin=origin or DateTime.now(),
+            branch=branch,
+            followup=followup,
+        )
+        outbound.timer = self.scheduler.schedule_in(delay, lambda: self.on_send_deadline(session, outbound))
+        session.outbound.append(outbound)
+        Metrics.increment(f"outbound.{kind}.queued")
+        return outbound
+
+    def pending(self, session: GameSession) -> bool:
+        return bool(session.outbound)
+
+    def withdraw(self, session: GameSession, before_id: int | None = None, reason: str = "obsolete") -> int:
+        """Cancel the queued messages written before the message `before_id`, by default all of them.
+
+        Messages due within `COMMIT_WINDOW` seconds and messages already being delivered are kept.
+
+        Returns:
+            int: the number of withdrawn messages.
+        """
+        now: float = asyncio.get_running_loop().time()
+        kept: List[OutboundMessage] = []
+        withdrawn: int = 0
+        for outbound in session.outbound:
+            due_soon: bool = outbound.timer is not None and outbound.timer.when - now < self.COMMIT_WINDOW
+            if outbound.committed or due_soon or (before_id is not None and outbound.after_id >= before_id):
+                kept.append(outbound)
+                continue
+            if outbound.timer is not None:
+                outbound.timer.cancel()
+                outbound.timer = None
+            if outbound.branch is not None:
+                outbound.branch.discard()  # its prediction follows a message that is never sent
+            Metrics.increment(f"outbound.{outbound.kind}.{reason}")
+            withdrawn += 1
+        if withdrawn:
+            self.logger.debug(f"{str(session)} Withdrew {withdrawn} queued messages ({reason})")
+            session.outbound.clear()
+            session.outbound.extend(kept)
+        return withdrawn
+
+    def on_send_deadline(self, session: GameSession, outbound: OutboundMessage) -> None:
+        outbound.timer = None
+        if not session.active:
+            return
+        outbound.task = asyncio.create_task(self.deliver_async(session, outbound))
+
+    async def deliver_async(self, session: GameSession, outbound: OutboundMessage) -> None:
+        try:
+            await self.deliver(session, outbound)
+            Metrics.increment(f"outbound.{outbound.kind}.sent")
+        except Exception as e:
+            self.logger.exception(f"{str(session)} Failed to deliver message: {e}")
+        finally:
+            if outbound in session.outbound:
+                session.outbound.remove(outbound)
+            outbound.task = None
@@ -1,6 +1,6 @@
-"""The StorageHandler class is responsible for managing the storage of chats in the bot.
+"""The StorageHandler class is responsible for managing the sessions of active games in the bot.
 
-It has methods to add, get, and remove chats from the storage, as well as persisting chats
+It has methods to add, get, and remove game sessions from the registry, as well as persisting chats
 to a persistent storage.
 This class shall be the only interface to interact with the storage of chats in the bot.
 """
@@ -8,10 +8,12 @@ This class shall be the only interface to interact with the storage of chats in
 import asyncio
 import os
 from logging import Logger
+from typing import Dict
 
 from fourmind.bot.common.logger_factory import LoggerFactory
-from fourmind.bot.models.chat import Chat
-from fourmind.bot.models.storage import ChatStorage
+from fourmind.bot.models.chat import Chat, GameID
+from fourmind.bot.models.persistence import ChatRecord
+from fourmind.bot.models.session import GameSession
 
 
 class StorageHandler:
@@ -19,46 +21,56 @@ class StorageHandler:
     STORE_PATH: str = os.path.abspath("data")
     logger.info(f"Store path: {STORE_PATH}")
 
-    def __init__(self, storage: ChatStorage, persist: bool) -> None:
-        self.__storage: ChatStorage = storage
+    def __init__(self, persist: bool) -> None:
+        self.__sessions: Dict[GameID, GameSession] = {}
         self.persist: bool = persist
 
-        # avoid race conditions when accessing shared resources
+        # avoid race conditions when modifying shared resources;
+        # reads do not suspend between the membership check and the lookup, so they need no lock
         self.lock = asyncio.Lock()
 
         if not os.path.exists(self.STORE_PATH):
             os.makedirs(self.STORE_PATH)
             self.logger.info(f"Store path created: {self.STORE_PATH}")
 
-    async def get(self, id: int) -> Chat | None:
-        async with self.lock:
-            if id in self.__storage.active_games:
-                return self.__storage.chats.get(id)
-            return None
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    async def get(self, id: int) -> GameSession | None:
+        return self.__sessions.get(id)
 
-    async def add(self, obj: Chat) -> None:
-        if obj.id in self.__storage.active_games:
+    async def add(self, obj: GameSession) -> None:
+        if obj.id in self.__sessions:
             self.logger.error(f"Chat with ID {obj.id} already exists in storage")
             raise ValueError(f"Chat with ID {obj.id} already exists in storage")
 
         async with self.lock:
-            self.__storage.active_games.add(obj.id)
-            self.__storage.chats[obj.id] = obj
-
-    async def remove(self, id: int) -> None:
-        if id in self.__storage.active_games:
-            async with self.lock:
-                self.__storage.active_games.remove(id)
-                try:
-                    chat = self.__storage.chats.pop(id)
-                    if self.persist:
-                        self._persist(chat)
-                    self.logger.debug(f"{str(chat)} removed from storage.")
-                except KeyError:
-                    self.logger.error(f"Chat with ID {id} not found in storage")
+            self.__sessions[obj.id] = obj
+
+    async def remove(self, id: int) -> GameSession | None:
+        """Remove the session from the registry.
+
+        Its chat is persisted by `finalize` once the game is torn down.
+
+        Returns:
+            GameSession | None: the removed session, or None if the game is unknown.
+        """
+        async with self.lock:
+            session: GameSession | None = self.__sessions.pop(id, None)
+        if session is None:
+            self.logger.error(f"Chat with ID {id} not found in storage")
+            return None
+
+        self.logger.debug(f"{str(session)} removed from storage.")
+        return session
+
+    def finalize(self, session: GameSession) -> None:
+        """Persist the chat of a removed session if persistence is enabled."""
+        if self.persist:
+            self._persist(session.chat)
 
     def _persist(self, chat: Chat) -> None:
         """Store the chat in a .json file."""
         with open(os.path.join(self.STORE_PATH, f"chat_{str(chat.id)[-8:]}.json"), "w") as file:
-            file.write(chat.model_dump_json(indent=4))
+            file.write(ChatRecord.from_chat(chat).model_dump_json(indent=4))
             self.logger.debug(f"{str(chat)} persisted to file.")